@@ -1,40 +1,62 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-import bcrypt
-import json
+import hmac
 import os
 import uuid
 import random
-import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+import jsonlog
+import metrics
+from mail_outbox import MailOutbox
+from pending_store import PendingRegistrations
+from password_hasher import HasherBusy, PasswordHasher
+from token_cache import RevocationList, TokenCache
+from user_store import UserStore
+
 # --------------------------------------------------
 # Config
 # --------------------------------------------------
 router = APIRouter(prefix="/auth", tags=["auth"])
 security = HTTPBearer()
+log = jsonlog.get_logger("auth")
+
+# bcrypt runs on its own bounded pool so login bursts can't starve other routes
+hasher = PasswordHasher()
 
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+async def hash_password(password: str) -> str:
+    try:
+        return await hasher.hash(password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many requests right now. Please try again shortly.")
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await hasher.verify(password, hashed)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many requests right now. Please try again shortly.")
 
 
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY", "ai-voice-assistant-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+# "claims": /auth/me answers from the verified token; "storage": re-reads the account
+AUTH_ME_SOURCE = os.getenv("AUTH_ME_SOURCE", "claims")
 
-USERS_FILE = os.path.join(os.path.dirname(__file__), "data", "users.json")
+users = UserStore()
+token_cache = TokenCache()
+revoked = RevocationList(ACCESS_TOKEN_EXPIRE_HOURS * 3600, store=users)
 
-# In-memory store for pending registrations (email -> registration data + OTP)
-pending_registrations: dict = {}
+# In-memory store for pending registrations (email -> registration data + OTP),
+# capped and swept by expiry
+pending_registrations = PendingRegistrations()
 
 
 # --------------------------------------------------
@@ -62,62 +84,81 @@ class VerifyOTPRequest(BaseModel):
     otp: str
 
 
-# --------------------------------------------------
-# Storage Helpers
-# --------------------------------------------------
-def get_users() -> list:
-    if not os.path.exists(USERS_FILE):
-        return []
-    with open(USERS_FILE, "r") as f:
-        return json.load(f)
-
-
-def save_users(users: list):
-    os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
-
-
 # --------------------------------------------------
 # JWT Helpers
 # --------------------------------------------------
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    # jti/iat let a single token, or every token of a user, be revoked
+    # iat is a float timestamp: a whole-second iat can't be ordered against a
+    # logout-all made in the same second
+    to_encode.update({"exp": expire, "iat": time.time(), "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if not user_id:
+async def verify_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Claims of a valid, unrevoked token. Repeat tokens skip the HMAC check."""
+
+    token = credentials.credentials
+    claims = token_cache.get(token)
+
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        if not claims.get("sub") or "exp" not in claims:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+        token_cache.put(token, claims)
+
+    if revoked.is_revoked(claims):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    return claims
+
+
+async def verify_token(claims: dict = Depends(verify_claims)) -> str:
+    return claims["sub"]
+
+
+def is_admin_key(key: str) -> bool:
+    """True if `key` matches ADMIN_API_KEY (never, while that is unset)."""
+
+    admin_key = os.getenv("ADMIN_API_KEY", "")
+    return bool(admin_key) and hmac.compare_digest(key.encode(), admin_key.encode())
+
+
+def require_admin(x_admin_key: str = Header(default="")):
+    """Operator-only routes: the X-Admin-Key header must match ADMIN_API_KEY.
+
+    With ADMIN_API_KEY unset, those routes are disabled.
+    """
+
+    if not os.getenv("ADMIN_API_KEY", ""):
+        raise HTTPException(status_code=403, detail="Admin routes are disabled")
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
 
 
 # --------------------------------------------------
 # Email Sender
 # --------------------------------------------------
+# SMTP settings are read once when the app starts (main.py lifespan calls
+# outbox.start()); sending happens on the outbox's background thread.
+outbox = MailOutbox()
+
+
 def send_otp_email(to_email: str, name: str, otp: str):
-    # Re-read .env on every call so credentials are always fresh
-    from dotenv import load_dotenv
-    load_dotenv(override=True)
-    gmail_user = os.getenv("GMAIL_USER")
-    gmail_password = os.getenv("GMAIL_APP_PASSWORD")
-
-    if not gmail_user or not gmail_password:
-        # Dev mode: print OTP to console instead of sending email
-        print(f"[OTP] Email not configured — OTP for {to_email}: {otp}")
+    if not outbox.configured:
+        # Dev mode: log the OTP instead of sending email (redacted unless LOG_REDACT=0)
+        log.warning("otp_not_sent", reason="email not configured", email=to_email, otp=otp)
         return
 
     msg = MIMEMultipart("alternative")
     msg["Subject"] = "Your verification code — AI Voice Assistant"
-    msg["From"] = f"AI Voice Assistant <{gmail_user}>"
-    msg["To"] = to_email
+    msg["From"] = f"AI Voice Assistant <{outbox.settings.sender}>"
 
     html = f"""
     <!DOCTYPE html>
@@ -179,44 +220,42 @@ def send_otp_email(to_email: str, name: str, otp: str):
     msg.attach(MIMEText(plain, "plain"))
     msg.attach(MIMEText(html, "html"))
 
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(gmail_user, gmail_password)
-            server.sendmail(gmail_user, to_email, msg.as_string())
-        print(f"[OTP] Email sent to {to_email}")
-    except Exception as e:
-        print(f"[OTP] Failed to send email: {e}")
-        raise HTTPException(status_code=500, detail="Failed to send OTP email. Please check your Gmail configuration.")
+    if not outbox.send(to_email, msg):
+        log.error("otp_not_sent", reason="outbox full", email=to_email)
+        raise HTTPException(status_code=503, detail="Too many requests right now. Please try again shortly.")
 
 
 # --------------------------------------------------
 # Routes
 # --------------------------------------------------
 @router.post("/send-otp")
-def send_otp(data: SendOTPRequest):
+async def send_otp(data: SendOTPRequest):
     """Validate registration data, send OTP to email."""
 
     if len(data.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
 
-    users = get_users()
-    if any(u["email"].lower() == data.email.lower() for u in users):
+    with metrics.stage("/auth/send-otp", "user_lookup"):
+        exists = users.email_exists(data.email)
+    if exists:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Generate 6-digit OTP
     otp = str(random.randint(100000, 999999))
-    expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat()
 
-    # Store pending registration
-    pending_registrations[data.email.lower().strip()] = {
+    with metrics.stage("/auth/send-otp", "bcrypt"):
+        password_hash = await hash_password(data.password)
+
+    # Store pending registration (replaces any earlier one for this email; sets expires_at)
+    pending_registrations.put(data.email.lower().strip(), {
         "name": data.name.strip(),
         "email": data.email.lower().strip(),
-        "password_hash": hash_password(data.password),
+        "password_hash": password_hash,
         "otp": otp,
-        "expires_at": expires_at,
-    }
+    })
 
-    send_otp_email(data.email, data.name.strip(), otp)
+    with metrics.stage("/auth/send-otp", "email"):
+        send_otp_email(data.email, data.name.strip(), otp)
 
     return {"message": "OTP sent to your email"}
 
@@ -236,19 +275,13 @@ def verify_otp(data: VerifyOTPRequest):
 
     # Check expiry
     if datetime.utcnow() > datetime.fromisoformat(pending["expires_at"]):
-        del pending_registrations[email]
+        pending_registrations.pop(email)
         raise HTTPException(status_code=400, detail="OTP has expired. Please request a new one.")
 
     # Check OTP
     if pending["otp"] != data.otp.strip():
         raise HTTPException(status_code=400, detail="Incorrect OTP. Please try again.")
 
-    # Race condition guard
-    users = get_users()
-    if any(u["email"].lower() == email for u in users):
-        del pending_registrations[email]
-        raise HTTPException(status_code=400, detail="Email already registered")
-
     # Create account
     user = {
         "id": str(uuid.uuid4()),
@@ -259,33 +292,43 @@ def verify_otp(data: VerifyOTPRequest):
         "email_verified": True,
     }
 
-    users.append(user)
-    save_users(users)
-    del pending_registrations[email]
+    # Race condition guard: the unique email index rejects a second account
+    with metrics.stage("/auth/verify-otp", "user_insert"):
+        added = users.add(user)
+    if not added:
+        pending_registrations.pop(email)
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    pending_registrations.pop(email)
 
     return {"message": "Account created successfully"}
 
 
 @router.post("/register")
-def register(data: RegisterRequest):
-    users = get_users()
-
-    if any(u["email"].lower() == data.email.lower() for u in users):
+async def register(data: RegisterRequest):
+    with metrics.stage("/auth/register", "user_lookup"):
+        exists = users.email_exists(data.email)
+    if exists:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     if len(data.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
 
+    with metrics.stage("/auth/register", "bcrypt"):
+        password_hash = await hash_password(data.password)
+
     user = {
         "id": str(uuid.uuid4()),
         "name": data.name.strip(),
         "email": data.email.lower().strip(),
-        "password_hash": hash_password(data.password),
+        "password_hash": password_hash,
         "created_at": datetime.utcnow().isoformat(),
     }
 
-    users.append(user)
-    save_users(users)
+    with metrics.stage("/auth/register", "user_insert"):
+        added = users.add(user)
+    if not added:
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     token = create_access_token({
         "sub": user["id"],
@@ -300,14 +343,27 @@ def register(data: RegisterRequest):
 
 
 @router.post("/login")
-def login(data: LoginRequest):
-    users = get_users()
+async def login(data: LoginRequest):
+    with metrics.stage("/auth/login", "user_lookup"):
+        user = users.get_by_email(data.email)
 
-    user = next((u for u in users if u["email"].lower() == data.email.lower().strip()), None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    if not user or not verify_password(data.password, user["password_hash"]):
+    with metrics.stage("/auth/login", "bcrypt"):
+        valid = await verify_password(data.password, user["password_hash"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    # BCRYPT_ROUNDS changed since this hash was made: upgrade it while we have the password
+    if hasher.needs_rehash(user["password_hash"]):
+        try:
+            with metrics.stage("/auth/login", "rehash"):
+                users.update_password_hash(user["id"], await hasher.hash(data.password))
+            hasher.rehashed += 1
+        except HasherBusy:
+            pass  # try again on a later login
+
     token = create_access_token({
         "sub": user["id"],
         "email": user["email"],
@@ -320,10 +376,49 @@ def login(data: LoginRequest):
     }
 
 
+@router.get("/hasher", dependencies=[Depends(require_admin)])
+def hasher_stats():
+    return hasher.stats()
+
+
+@router.get("/pending", dependencies=[Depends(require_admin)])
+def pending_stats():
+    return pending_registrations.stats()
+
+
+@router.get("/outbox", dependencies=[Depends(require_admin)])
+def outbox_stats():
+    return outbox.stats()
+
+
 @router.get("/me")
-def get_me(user_id: str = Depends(verify_token)):
-    users = get_users()
-    user = next((u for u in users if u["id"] == user_id), None)
+async def get_me(claims: dict = Depends(verify_claims)):
+    if AUTH_ME_SOURCE == "claims" and "name" in claims and "email" in claims:
+        return {"id": claims["sub"], "name": claims["name"], "email": claims["email"]}
+
+    user = users.get_by_id(claims["sub"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"id": user["id"], "name": user["name"], "email": user["email"]}
+
+
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security),
+                 claims: dict = Depends(verify_claims)):
+    """Revoke the presented token."""
+
+    if "jti" in claims:
+        revoked.revoke_token(claims["jti"], claims["exp"])
+    else:
+        # Tokens issued before jti existed can only be revoked per user
+        revoked.revoke_user(claims["sub"])
+    token_cache.discard(credentials.credentials)
+    return {"message": "Logged out"}
+
+
+@router.post("/logout-all")
+async def logout_all(claims: dict = Depends(verify_claims)):
+    """Revoke every token issued to this user so far."""
+
+    revoked.revoke_user(claims["sub"])
+    return {"message": "Logged out everywhere"}
@@ -0,0 +1,74 @@
+"""Invoice rendering throughput: the full page rebuilt per invoice vs the cached process template.
+
+    cd backend
+    python benchmarks/bench_invoice.py [-n 200] [--rounds 5]
+
+"old" is the pre-template behaviour: every colour, style, table style and
+static table is built for each invoice, and the header/footer is drawn into
+every page. "new" reuses get_template() and stamps the chrome form XObject.
+Both render to memory, so disk writes don't blur the difference, and the
+two paths alternate for several rounds with the best round reported, so a
+noisy neighbour doesn't decide the result.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_FILE", os.devnull)   # silence the font log lines while timing
+
+import invoice  # noqa: E402
+
+SESSION = {
+    "store": "Apple Computers",
+    "product": "MacBook Pro",
+    "details": "Display screen repair",
+    "appointment_date": "2026-03-02",
+    "appointment_time": "18:00",
+}
+
+
+class UncachedTemplate(invoice.InvoiceTemplate):
+    """Draws the chrome straight into each page, as before it became a form XObject."""
+
+    def decorate_page(self, c, doc):
+        c.saveState()
+        self._draw_chrome(c)
+
+        c.setFillColor(invoice.C_INDIGO_MID)
+        c.setFont(self.font_bold, 11)
+        c.drawRightString(invoice.W - 45, invoice.H - 49, f"# {doc.invoice_number}")
+
+        c.restoreState()
+
+
+def run(label: str, n: int, fresh_template: bool) -> float:
+    """Render n invoices and return invoices/second."""
+    start = time.perf_counter()
+    for i in range(n):
+        template = UncachedTemplate(invoice._FONT_REG, invoice._FONT_BOLD) if fresh_template else None
+        invoice.render_invoice(f"bench-{label}-{i}", SESSION, template=template)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="invoices per path per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    invoice.render_invoice("warmup", SESSION)   # fonts, get_template()
+
+    old = new = 0.0
+    for _ in range(args.rounds):
+        old = max(old, run("old", args.n, fresh_template=True))
+        new = max(new, run("new", args.n, fresh_template=False))
+
+    print(f" old: {old:.1f} invoices/s")
+    print(f" new: {new:.1f} invoices/s")
+    print(f"speed-up: {new / old:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
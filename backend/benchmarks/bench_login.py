@@ -0,0 +1,104 @@
+"""Login throughput against the bcrypt cost factor.
+
+    cd backend
+    python benchmarks/bench_login.py [--rounds 8 10 12] [-n 40] [-c 16] [--workers 2]
+
+For each cost, one account is created with that cost and -n logins are sent
+through the in-process /auth/login route, -c at a time. Alongside, a trivial
+endpoint is polled to show that requests not touching bcrypt keep answering
+quickly while the hasher pool is saturated.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("USER_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-login-"), "users.db"))
+
+from fastapi import FastAPI  # noqa: E402
+
+import auth  # noqa: E402
+from password_hasher import PasswordHasher  # noqa: E402
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def run_cost(app, rounds: int, n: int, concurrency: int, workers: int) -> dict:
+    auth.hasher = PasswordHasher(rounds=rounds, workers=workers, max_queue=n)
+    email = f"bench-{rounds}@example.com"
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.post("/auth/register", json={"name": "Bench", "email": email, "password": "secret123"})
+
+        slots = asyncio.Semaphore(concurrency)
+        login_times, ping_times = [], []
+        done = False
+
+        async def login():
+            async with slots:
+                start = time.perf_counter()
+                r = await client.post("/auth/login", json={"email": email, "password": "secret123"})
+                r.raise_for_status()
+                login_times.append(time.perf_counter() - start)
+
+        async def ping():
+            while not done:
+                start = time.perf_counter()
+                await client.get("/ping")
+                ping_times.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        pinger = asyncio.create_task(ping())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(n)))
+        elapsed = time.perf_counter() - start
+        done = True
+        await pinger
+
+    auth.hasher.shutdown()
+    return {
+        "rounds": rounds,
+        "logins_per_s": n / elapsed,
+        "p50": percentile(login_times, 50) * 1000,
+        "p95": percentile(login_times, 95) * 1000,
+        "ping_p95": percentile(ping_times, 95) * 1000,
+    }
+
+
+async def main_async(args):
+    app = FastAPI()
+    app.include_router(auth.router)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    print(f"{args.logins} logins per cost, "
+          f"{args.concurrency} concurrent, {args.workers} bcrypt workers\n")
+    print(f"{'rounds':>6} {'logins/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'other route p95 ms':>19}")
+    for rounds in args.rounds:
+        r = await run_cost(app, rounds, args.logins, args.concurrency, args.workers)
+        print(f"{r['rounds']:>6} {r['logins_per_s']:>9.1f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['ping_p95']:>19.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("-n", "--logins", type=int, default=40)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Cold start: time from process start to the first request served.
+
+    cd backend
+    python benchmarks/bench_startup.py [-n 5]
+
+Each run launches a fresh `uvicorn main:app` (LLM_PROVIDER=fake, so no key
+or network is needed) and polls it until a request succeeds. Also reports
+how long `import main` takes and whether ReportLab got loaded by it.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def child_env() -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    return {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "USER_DB_PATH": os.path.join(tmp, "users.db"),
+    }
+
+
+def time_to_first_request(timeout: float) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1).read()
+                return time.perf_counter() - start
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                time.sleep(0.01)
+        raise RuntimeError(f"no response within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def import_profile() -> tuple:
+    code = (
+        "import sys, time; t = time.perf_counter(); import main; "
+        "print(time.perf_counter() - t, 'reportlab' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=child_env(),
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[-2]), out[-1] == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=5, help="cold starts to time")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import_s, reportlab_loaded = import_profile()
+    print(f"import main: {import_s * 1000:.0f} ms (ReportLab loaded: {'yes' if reportlab_loaded else 'no'})")
+
+    runs = [time_to_first_request(args.timeout) for _ in range(args.n)]
+    print(f"process start → first response over {args.n} runs: "
+          f"median {statistics.median(runs) * 1000:.0f} ms, "
+          f"min {min(runs) * 1000:.0f} ms, max {max(runs) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
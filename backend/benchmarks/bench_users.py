@@ -0,0 +1,110 @@
+"""User lookups at scale: users.json load-and-scan vs the indexed SQLite store.
+
+    cd backend
+    python benchmarks/bench_users.py [-n 100000] [--lookups 200]
+
+"old" is what every auth route used to do: json.load the whole users.json,
+then scan it by email or id; registering rewrote the whole file. "new" is
+user_store.UserStore, including the one-time migration from that file.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_store import UserStore  # noqa: E402
+
+# A real bcrypt hash is 60 characters; the value itself is never checked here
+FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+def make_users(n: int) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"User {i}",
+            "email": f"user{i}@example.com",
+            "password_hash": FAKE_HASH,
+            "created_at": "2026-01-01T00:00:00",
+            "email_verified": True,
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    """Mean milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200, help="lookups per new-store measurement")
+    parser.add_argument("--old-lookups", type=int, default=5, help="lookups per users.json measurement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-users-")
+    users_file = os.path.join(workdir, "users.json")
+    users = make_users(args.users)
+    with open(users_file, "w") as f:
+        json.dump(users, f, indent=2)
+    print(f"{args.users} users, users.json = {os.path.getsize(users_file) / 1e6:.1f} MB\n")
+
+    sample = [random.choice(users) for _ in range(max(args.lookups, args.old_lookups))]
+    picks = iter(sample * 4)
+
+    def load():
+        with open(users_file) as f:
+            return json.load(f)
+
+    def old_by_email():
+        u = next(picks)
+        return next(x for x in load() if x["email"].lower() == u["email"])
+
+    def old_by_id():
+        u = next(picks)
+        return next(x for x in load() if x["id"] == u["id"])
+
+    def old_register():
+        all_users = load()
+        all_users.append({**users[0], "id": str(uuid.uuid4()), "email": f"{uuid.uuid4()}@example.com"})
+        with open(users_file, "w") as f:
+            json.dump(all_users, f, indent=2)
+
+    old = {
+        "lookup by email": timed(old_by_email, args.old_lookups),
+        "lookup by id": timed(old_by_id, args.old_lookups),
+        "register": timed(old_register, args.old_lookups),
+    }
+
+    start = time.perf_counter()
+    store = UserStore(os.path.join(workdir, "users.db"), users_file)
+    migrate_s = time.perf_counter() - start
+
+    def new_register():
+        store.add({**users[0], "id": str(uuid.uuid4()), "email": f"{uuid.uuid4()}@example.com"})
+
+    new = {
+        "lookup by email": timed(lambda: store.get_by_email(next(picks)["email"]), args.lookups),
+        "lookup by id": timed(lambda: store.get_by_id(next(picks)["id"]), args.lookups),
+        "register": timed(new_register, args.lookups),
+    }
+
+    print(f"one-time migration: {migrate_s:.2f}s ({len(store)} accounts)\n")
+    print(f"{'':18} {'users.json ms':>14} {'sqlite ms':>10} {'speedup':>9}")
+    for name in old:
+        print(f"{name:18} {old[name]:>14.2f} {new[name]:>10.3f} {old[name] / new[name]:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Load test for the booking flow: session/start → session/message → invoice.
+
+    cd backend
+    python benchmarks/load_test.py -n 500 -c 100                 # in-process, fake LLM
+    python benchmarks/load_test.py -n 500 -c 100 --latency fixed:0.3 --error-rate 0.02
+    python benchmarks/load_test.py --url http://localhost:8001    # a running server
+
+In-process runs import main.py with LLM_PROVIDER=fake, so no network or
+OpenAI key is needed. Reports throughput and p50/p95/p99 latency for each
+endpoint and for each stage (LLM call, invoice wait, whole conversation).
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Two turns the local date parser can't answer (so they reach the LLM),
+# then one it can (the fast path, unless BOOKING_FAST_PATH=0)
+CONVERSATION = [
+    "Hi, I'd like to book an appointment please.",
+    "Do you have anything next week, ideally in the morning?",
+    "Next Friday at 10am works for me.",
+]
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            raise
+        finally:
+            self.add(name, time.perf_counter() - start)
+        return response
+
+    def report(self, elapsed: float, conversations: int):
+        requests = sum(len(v) for k, v in self.samples.items() if k.startswith(("GET", "POST")))
+        print(f"\n{conversations} conversations in {elapsed:.2f}s  →  "
+              f"{conversations / elapsed:.1f} conversations/s, {requests / elapsed:.1f} requests/s\n")
+        print(f"{'':34} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+        for name in sorted(self.samples):
+            values = self.samples[name]
+            print(
+                f"{name:34} {len(values):>7} "
+                + " ".join(f"{percentile(values, p) * 1000:>9.1f}" for p in (50, 95, 99))
+                + f" {max(values) * 1000:>9.1f} {self.errors.get(name, 0):>7}"
+            )
+
+
+async def conversation(client: httpx.AsyncClient, rec: Recorder, stream: bool, invoice_timeout: float):
+    started = time.perf_counter()
+
+    r = await rec.request(client, "POST /session/start", "POST", "/session/start", json={
+        "store": "Load Test Store",
+        "product": "MacBook Pro",
+        "details": "Display screen repair",
+    })
+    session_id = r.json()["session_id"]
+
+    path = "/session/message/stream" if stream else "/session/message"
+    completed = False
+    for text in CONVERSATION:
+        r = await rec.request(client, f"POST {path}", "POST", path,
+                              json={"session_id": session_id, "message": text})
+        completed = '"completed": true' in r.text if stream else r.json().get("completed")
+        if completed:
+            break
+
+    if completed:
+        wait_start = time.perf_counter()
+        while time.perf_counter() - wait_start < invoice_timeout:
+            r = await rec.request(client, "GET /session/{id}/invoice", "GET", f"/session/{session_id}/invoice")
+            if r.json().get("status") in ("ready", "failed"):
+                break
+            await asyncio.sleep(0.05)
+        rec.add("stage: invoice ready wait", time.perf_counter() - wait_start)
+
+    rec.add("stage: whole conversation", time.perf_counter() - started)
+
+
+def _instrument_llm(main, rec: Recorder):
+    """Time every call the app makes to the (fake) LLM."""
+    completions = main.client.chat.completions
+    create = completions.create
+
+    async def timed_create(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await create(*args, **kwargs)
+        finally:
+            rec.add("stage: llm call", time.perf_counter() - start)
+
+    completions.create = timed_create
+
+
+async def run(args):
+    rec = Recorder()
+    lifespan = contextlib.nullcontext()
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        os.environ["LLM_PROVIDER"] = "fake"
+        os.environ["FAKE_LLM_LATENCY"] = args.latency
+        os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+        if not args.verbose:
+            # The app logs every turn; keep the report readable (the logger still runs)
+            os.environ.setdefault("LOG_FILE", os.devnull)
+        os.chdir(tempfile.mkdtemp(prefix="load-test-"))  # invoices/ lands here
+
+        import main
+        _instrument_llm(main, rec)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                   base_url="http://load-test", timeout=60)
+        # ASGITransport doesn't send lifespan events: run the app's startup and
+        # shutdown ourselves so the outbox, pending store and sweeper are live
+        lifespan = main.app.router.lifespan_context(main.app)
+
+    slots = asyncio.Semaphore(args.concurrency)
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with slots:
+            try:
+                await conversation(client, rec, args.stream, args.invoice_timeout)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    async with lifespan, client:
+        await asyncio.gather(*(one() for _ in range(args.conversations)))
+        elapsed = time.perf_counter() - start
+
+    rec.report(elapsed, args.conversations)
+    if failures:
+        print(f"\n{failures} conversations failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking flow load test")
+    parser.add_argument("-n", "--conversations", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--stream", action="store_true", help="use /session/message/stream")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--latency", default="lognormal:0.6,0.35", help="fake LLM latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake LLM error rate")
+    parser.add_argument("--invoice-timeout", type=float, default=30.0)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
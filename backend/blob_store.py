@@ -0,0 +1,493 @@
+import asyncio
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from typing import Iterator, NamedTuple, Optional
+
+import jsonlog
+
+log = jsonlog.get_logger("blob_store")
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+INVOICE_STORE          = os.getenv("INVOICE_STORE", "local")                     # local | memory
+INVOICE_DIR            = os.getenv("INVOICE_DIR", "invoices")
+INVOICE_MEM_BYTES      = int(os.getenv("INVOICE_MEM_BYTES", str(64 * 1024 * 1024)))
+INVOICE_RETENTION_DAYS = int(os.getenv("INVOICE_RETENTION_DAYS", "0"))           # 0 = keep forever
+INVOICE_SWEEP_INTERVAL = float(os.getenv("INVOICE_SWEEP_INTERVAL", "3600"))      # seconds
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobInfo(NamedTuple):
+    size: int
+    etag: str        # quoted, ready for the ETag header
+    modified: float  # unix time
+
+
+def _utc_day(timestamp: float) -> datetime.date:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).date()
+
+
+def issue_day(issued_at: Optional[str]) -> Optional[datetime.date]:
+    """The UTC day an invoice belongs to, from its ISO `issued_at`; None if unknown.
+
+    Older sessions stored a naive local time, which astimezone() reads as local.
+    """
+    try:
+        issued = datetime.datetime.fromisoformat(issued_at) if issued_at else None
+    except ValueError:
+        return None
+    return issued.astimezone(datetime.timezone.utc).date() if issued else None
+
+
+# --------------------------------------------------
+# Interface
+# --------------------------------------------------
+class BlobStore:
+    """Where rendered invoices live, keyed by file name ("{session_id}.pdf").
+
+    Every blob belongs to a day: the `day` given to `put()` (the invoice's
+    issue date), or the UTC day it was stored. Pass the same day to look it
+    up again. `read()` yields the bytes in [start, end) in chunks so a
+    response can stream them (and serve Range requests) without loading the
+    whole blob. `list_days()` and `sweep()` work on that day.
+    """
+
+    def put(self, key: str, data: bytes, day: datetime.date = None) -> BlobInfo:
+        raise NotImplementedError
+
+    def stat(self, key: str, day: datetime.date = None) -> Optional[BlobInfo]:
+        raise NotImplementedError
+
+    def read(self, key: str, start: int = 0, end: int = None,
+             chunk_size: int = CHUNK_SIZE, day: datetime.date = None) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def delete(self, key: str, day: datetime.date = None):
+        raise NotImplementedError
+
+    def list_days(self, first: datetime.date, last: datetime.date) -> Iterator[tuple]:
+        """(day, key, BlobInfo) for blobs stored on days first..last, oldest day first."""
+        raise NotImplementedError
+
+    def sweep(self, before: datetime.date) -> int:
+        """Delete blobs stored before `before`; returns how many were removed."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _content_etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+# --------------------------------------------------
+# Local directory, sharded by day (shared volume → any worker can serve any invoice)
+# --------------------------------------------------
+class LocalBlobStore(BlobStore):
+    """One file per blob under `directory/YYYY/MM/DD/`, by the blob's day.
+    No directory grows past one day's invoices, retention removes whole day
+    directories, and a date-range export only walks the days it needs.
+
+    Writes go to a temp file and are renamed into place, so a reader never
+    sees a half-written PDF. A lookup with the day checks exactly one path;
+    without it, only a small path cache and the old flat layout are checked.
+    A miss never walks the day directories, so unknown keys cost the same as
+    known ones.
+    """
+
+    PATH_CACHE_SIZE = 10000
+
+    def __init__(self, directory: str = INVOICE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._paths: "OrderedDict[str, str]" = OrderedDict()   # key -> path
+        self._lock = threading.Lock()
+        self.swept = 0
+
+    @staticmethod
+    def _check_key(key: str):
+        if not key or key.startswith(".") or "/" in key or os.sep in key:
+            raise ValueError(f"Invalid blob key: {key!r}")
+
+    def _day_dir(self, day: datetime.date) -> str:
+        return os.path.join(self.directory, f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+    def _day_dirs(self) -> list:
+        """[(day, dir)] newest first — for listing and sweeping, never for lookups."""
+        days = []
+        for y in _numeric_entries(self.directory):
+            for m in _numeric_entries(y.path):
+                for d in _numeric_entries(m.path):
+                    try:
+                        days.append((datetime.date(int(y.name), int(m.name), int(d.name)), d.path))
+                    except ValueError:
+                        continue
+        days.sort(reverse=True)
+        return days
+
+    def _remember(self, key: str, path: str):
+        with self._lock:
+            self._paths[key] = path
+            self._paths.move_to_end(key)
+            while len(self._paths) > self.PATH_CACHE_SIZE:
+                self._paths.popitem(last=False)
+
+    def _find(self, key: str, day: datetime.date = None) -> Optional[str]:
+        self._check_key(key)
+        if day is not None:
+            path = os.path.join(self._day_dir(day), key)
+            if os.path.exists(path):
+                return path
+
+        with self._lock:
+            path = self._paths.get(key)
+        if path is not None and os.path.exists(path):
+            return path
+
+        legacy = os.path.join(self.directory, key)   # flat layout from before sharding
+        if os.path.exists(legacy):
+            return legacy
+        return None
+
+    def put(self, key: str, data: bytes, day: datetime.date = None) -> BlobInfo:
+        self._check_key(key)
+        day_dir = self._day_dir(day or _utc_day(time.time()))
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(day_dir, key)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        with self._lock:
+            previous = self._paths.get(key)
+        # Re-stored under another day, or first stored before sharding: don't
+        # leave the old copy for export and retention, or for a lookup without
+        # the day to serve instead of this one
+        for stale in {previous, os.path.join(self.directory, key)} - {None, path}:
+            try:
+                os.unlink(stale)
+            except FileNotFoundError:
+                pass
+        self._remember(key, path)
+        return self._info(path)
+
+    @staticmethod
+    def _info(path: str) -> BlobInfo:
+        st = os.stat(path)
+        # Size + mtime, like StaticFiles: no need to read the file to answer If-None-Match
+        return BlobInfo(st.st_size, f'"{st.st_size:x}-{st.st_mtime_ns:x}"', st.st_mtime)
+
+    def stat(self, key: str, day: datetime.date = None) -> Optional[BlobInfo]:
+        try:
+            path = self._find(key, day)
+            return self._info(path) if path else None
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read(self, key: str, start: int = 0, end: int = None,
+             chunk_size: int = CHUNK_SIZE, day: datetime.date = None) -> Iterator[bytes]:
+        path = self._find(key, day)
+        if path is None:
+            raise FileNotFoundError(key)
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str, day: datetime.date = None):
+        path = self._find(key, day)
+        if path is not None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._paths.pop(key, None)
+
+    def list_days(self, first: datetime.date, last: datetime.date) -> Iterator[tuple]:
+        for day, day_dir in reversed(self._day_dirs()):
+            if not first <= day <= last:
+                continue
+            with os.scandir(day_dir) as entries:
+                names = sorted(e.name for e in entries if e.is_file() and not e.name.startswith("."))
+            for name in names:
+                try:
+                    yield day, name, self._info(os.path.join(day_dir, name))
+                except FileNotFoundError:
+                    continue   # swept or replaced while listing
+
+        # Flat files from before sharding, dated by mtime
+        with os.scandir(self.directory) as entries:
+            legacy = sorted(
+                (e for e in entries if e.is_file() and not e.name.startswith(".")),
+                key=lambda e: e.stat().st_mtime,
+            )
+        for entry in legacy:
+            day = _utc_day(entry.stat().st_mtime)
+            if first <= day <= last:
+                yield day, entry.name, self._info(entry.path)
+
+    def sweep(self, before: datetime.date) -> int:
+        removed = 0
+        for day, day_dir in self._day_dirs():
+            if day >= before:
+                continue
+            removed += sum(1 for _ in os.scandir(day_dir))
+            shutil.rmtree(day_dir, ignore_errors=True)
+            # Drop month/year directories left empty
+            for parent in (os.path.dirname(day_dir), os.path.dirname(os.path.dirname(day_dir))):
+                try:
+                    os.rmdir(parent)
+                except OSError:
+                    break
+
+        cutoff = datetime.datetime.combine(before, datetime.time(), datetime.timezone.utc).timestamp()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith(".") and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+
+        with self._lock:
+            self._paths.clear()
+        self.swept += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {"backend": "local", "directory": self.directory, "swept": self.swept}
+
+
+def _numeric_entries(path: str) -> list:
+    try:
+        with os.scandir(path) as entries:
+            return [e for e in entries if e.is_dir() and e.name.isdigit()]
+    except FileNotFoundError:
+        return []
+
+
+# --------------------------------------------------
+# In-memory LRU of recent invoices
+# --------------------------------------------------
+class MemoryBlobStore(BlobStore):
+    """Most recently stored/read blobs, up to `max_bytes` in total.
+
+    Per process: with several API workers, use the local store on a shared
+    volume instead.
+    """
+
+    def __init__(self, max_bytes: int = INVOICE_MEM_BYTES):
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (data, info, day)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.swept = 0
+
+    def put(self, key: str, data: bytes, day: datetime.date = None) -> BlobInfo:
+        info = BlobInfo(len(data), _content_etag(data), time.time())
+        with self._lock:
+            old = self._blobs.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1].size
+            self._blobs[key] = (data, info, day or _utc_day(info.modified))
+            self._bytes += info.size
+            while self._bytes > self.max_bytes and len(self._blobs) > 1:
+                _, (_, dropped, _) = self._blobs.popitem(last=False)
+                self._bytes -= dropped.size
+                self.evicted += 1
+        return info
+
+    def stat(self, key: str, day: datetime.date = None) -> Optional[BlobInfo]:
+        with self._lock:
+            entry = self._blobs.get(key)
+            if entry is None:
+                return None
+            self._blobs.move_to_end(key)
+            return entry[1]
+
+    def read(self, key: str, start: int = 0, end: int = None,
+             chunk_size: int = CHUNK_SIZE, day: datetime.date = None) -> Iterator[bytes]:
+        with self._lock:
+            entry = self._blobs.get(key)
+        if entry is None:
+            raise FileNotFoundError(key)
+        view = memoryview(entry[0])[start:end]
+        for i in range(0, len(view), chunk_size):
+            yield bytes(view[i:i + chunk_size])
+
+    def delete(self, key: str, day: datetime.date = None):
+        with self._lock:
+            old = self._blobs.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1].size
+
+    def list_days(self, first: datetime.date, last: datetime.date) -> Iterator[tuple]:
+        with self._lock:
+            items = [(day, key, info) for key, (_, info, day) in self._blobs.items()]
+        for day, key, info in sorted(items, key=lambda item: (item[0], item[2].modified)):
+            if first <= day <= last:
+                yield day, key, info
+
+    def sweep(self, before: datetime.date) -> int:
+        with self._lock:
+            old = [key for key, (_, _, day) in self._blobs.items() if day < before]
+        for key in old:
+            self.delete(key)
+        self.swept += len(old)
+        return len(old)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "blobs": len(self._blobs),
+            "bytes": self._bytes,
+            "evicted": self.evicted,
+            "swept": self.swept,
+        }
+
+
+def create_blob_store() -> BlobStore:
+    """Build the store selected by INVOICE_STORE."""
+    if INVOICE_STORE == "memory":
+        return MemoryBlobStore()
+    return LocalBlobStore()
+
+
+# --------------------------------------------------
+# Retention sweeper
+# --------------------------------------------------
+class RetentionSweeper:
+    """Deletes blobs older than `retention_days`, every `interval` seconds.
+
+    Runs as a background task (started from the app lifespan); the sweep
+    itself is file I/O, so it runs in a thread.
+    """
+
+    def __init__(self, store: BlobStore, retention_days: int = INVOICE_RETENTION_DAYS,
+                 interval: float = INVOICE_SWEEP_INTERVAL):
+        self.store = store
+        self.retention_days = retention_days
+        self.interval = interval
+        self._task = None
+        self.runs = 0
+        self.removed = 0
+        self.last_run_ms = 0.0
+
+    def start(self):
+        if self._task is None and self.retention_days > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                log.error("retention_sweep_failed", error=repr(e))
+            await asyncio.sleep(self.interval)
+
+    def run_once(self) -> int:
+        start = time.perf_counter()
+        before = _utc_day(time.time()) - datetime.timedelta(days=self.retention_days)
+        removed = self.store.sweep(before)
+        self.runs += 1
+        self.removed += removed
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        if removed:
+            log.info("retention_swept", removed=removed, before=before.isoformat(), ms=round(self.last_run_ms, 1))
+        return removed
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "retention_days": self.retention_days,
+            "runs": self.runs,
+            "removed": self.removed,
+            "last_run_ms": self.last_run_ms,
+        }
+
+
+# --------------------------------------------------
+# Streaming ZIP export
+# --------------------------------------------------
+class _ChunkSink:
+    """Write-only, unseekable file object that hands written bytes back out.
+
+    zipfile notices it can't seek and writes each entry with a trailing data
+    descriptor, so the archive is produced strictly front to back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(store: BlobStore, first: datetime.date, last: datetime.date) -> Iterator[bytes]:
+    """ZIP of every blob stored on days first..last, as "YYYY-MM-DD/key" entries.
+
+    Yields the archive as it is written: memory use is one read chunk,
+    whatever the size of the export. PDFs are already compressed, so entries
+    are stored rather than deflated.
+    """
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for day, key, info in store.list_days(first, last):
+            entry = zipfile.ZipInfo(f"{day.isoformat()}/{key}",
+                                    time.gmtime(info.modified)[:6])
+            entry.compress_type = zipfile.ZIP_STORED
+
+            chunks = store.read(key, day=day)
+            try:
+                first_chunk = next(chunks, b"")   # opens the blob before the entry is started
+            except FileNotFoundError:
+                continue   # swept between listing and reading
+
+            with zf.open(entry, "w", force_zip64=info.size >= 2 ** 31) as out:
+                out.write(first_chunk)
+                for chunk in chunks:
+                    out.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,204 @@
+import datetime
+import re
+
+# --------------------------------------------------
+# Local date/time extraction for booking turns
+# --------------------------------------------------
+# Handles the common, unambiguous phrasings ("March 2nd at 6pm",
+# "03/02/2026 18:00", "next Tuesday at 10am", "tomorrow 9:30") so that
+# handle_message can skip the LLM. Anything it is not sure about returns
+# confident=False and goes to the model as before.
+
+MAX_DAYS_AHEAD = 92  # "within the next 3 months"
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+_WEEKDAYS = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1, "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, "fri": 4, "friday": 4,
+    "saturday": 5, "sunday": 6,   # no "sat"/"sun": too often plain words
+}
+
+_MONTH_RE = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_WEEKDAY_RE = "|".join(sorted(_WEEKDAYS, key=len, reverse=True))
+_ORD = r"(?:st|nd|rd|th)?"
+
+_DATE_PATTERNS = [
+    # 2026-03-02
+    ("iso",       re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")),
+    # 03/02/2026, 3/2/26, 3/2  (month first, like the prompt examples)
+    ("numeric",   re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")),
+    # March 2nd, Mar 2 2026, March 2nd, 2026
+    ("month_day", re.compile(rf"\b({_MONTH_RE})\.?\s+(\d{{1,2}}){_ORD}(?:,?\s+(\d{{4}}))?\b")),
+    # 2nd March, 2 of March 2026
+    ("day_month", re.compile(rf"\b(\d{{1,2}}){_ORD}\s+(?:of\s+)?({_MONTH_RE})\.?(?:,?\s+(\d{{4}}))?\b")),
+    # day after tomorrow / tomorrow / today / tonight
+    ("relative",  re.compile(r"\b(day after tomorrow|tomorrow|today|tonight)\b")),
+    # next Tuesday, this Friday, on Monday, Monday
+    ("weekday",   re.compile(rf"\b(?:(next|this|coming|on)\s+)?({_WEEKDAY_RE})\b")),
+    # in 3 days
+    ("in_days",   re.compile(r"\bin\s+(\d{1,2})\s+days?\b")),
+]
+
+_TIME_PATTERNS = [
+    # 6pm, 6 pm, 6:30pm, 6.30 p.m.
+    ("ampm",  re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?m\.?(?![a-z])")),
+    # 18:00, 9:30 (24-hour)
+    ("h24",   re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")),
+    ("named", re.compile(r"\b(noon|midday|midnight)\b")),
+]
+
+# Phrases that mean the customer is hedging, correcting or asking — let the model handle it
+_UNSURE_RE = re.compile(
+    r"\?|\b(not|don't|dont|can't|cant|cannot|won't|instead|or|maybe|either|"
+    r"unless|except|between|available|availability|change|reschedule|cancel)\b"
+)
+
+
+def _resolve_year(month: int, day: int, today: datetime.date):
+    """Nearest occurrence of month/day that is today or later."""
+    for year in (today.year, today.year + 1):
+        try:
+            d = datetime.date(year, month, day)
+        except ValueError:
+            return None
+        if d >= today:
+            return d
+    return None
+
+
+def _full_year(y: str) -> int:
+    y = int(y)
+    return y + 2000 if y < 100 else y
+
+
+def _parse_date(kind: str, m, today: datetime.date):
+    try:
+        if kind == "iso":
+            return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        if kind == "numeric":
+            month, day = int(m.group(1)), int(m.group(2))
+            if m.group(3):
+                return datetime.date(_full_year(m.group(3)), month, day)
+            return _resolve_year(month, day, today)
+        if kind == "month_day":
+            month, day = _MONTHS[m.group(1)], int(m.group(2))
+            if m.group(3):
+                return datetime.date(int(m.group(3)), month, day)
+            return _resolve_year(month, day, today)
+        if kind == "day_month":
+            day, month = int(m.group(1)), _MONTHS[m.group(2)]
+            if m.group(3):
+                return datetime.date(int(m.group(3)), month, day)
+            return _resolve_year(month, day, today)
+    except ValueError:
+        return None
+
+    if kind == "relative":
+        word = m.group(1)
+        offset = {"today": 0, "tonight": 0, "tomorrow": 1, "day after tomorrow": 2}[word]
+        return today + datetime.timedelta(days=offset)
+
+    if kind == "weekday":
+        qualifier, weekday = m.group(1), _WEEKDAYS[m.group(2)]
+        ahead = (weekday - today.weekday()) % 7
+        if ahead == 0 and qualifier != "this":
+            ahead = 7  # "next Tuesday" / "Tuesday" said on a Tuesday means a week out
+        return today + datetime.timedelta(days=ahead)
+
+    if kind == "in_days":
+        return today + datetime.timedelta(days=int(m.group(1)))
+
+    return None
+
+
+def _parse_time(kind: str, m, tonight: bool):
+    if kind == "ampm":
+        hour, minute, half = int(m.group(1)), int(m.group(2) or 0), m.group(3)
+        if not 1 <= hour <= 12 or minute > 59:
+            return None
+        if half == "a":
+            hour = 0 if hour == 12 else hour
+        else:
+            hour = 12 if hour == 12 else hour + 12
+        return datetime.time(hour, minute)
+
+    if kind == "h24":
+        hour, minute = int(m.group(1)), int(m.group(2))
+        if tonight and hour < 12:
+            hour += 12
+        return datetime.time(hour, minute)
+
+    if kind == "named":
+        return datetime.time(0, 0) if m.group(1) == "midnight" else datetime.time(12, 0)
+
+    return None
+
+
+def _find_all(patterns, text: str, parse) -> list:
+    """Every non-overlapping match, earlier patterns taking precedence."""
+    found, taken = [], []
+    for kind, regex in patterns:
+        for m in regex.finditer(text):
+            span = range(m.start(), m.end())
+            if any(s.start < m.end() and m.start() < s.stop for s in taken):
+                continue
+            value = parse(kind, m)
+            if value is not None:
+                taken.append(span)
+                found.append(value)
+    return found
+
+
+def extract_appointment(text: str, now: datetime.datetime = None) -> dict:
+    """Pull an appointment date and time out of one customer message.
+
+    Returns {"date": date|None, "time": time|None, "confident": bool}.
+    `confident` is True only when exactly one date and one time were found,
+    the message does not hedge, and the slot satisfies the booking rule
+    (today or later, within MAX_DAYS_AHEAD days, not already past).
+    """
+
+    now = now or datetime.datetime.now()
+    today = now.date()
+    lowered = text.lower()
+
+    dates = _find_all(_DATE_PATTERNS, lowered, lambda k, m: _parse_date(k, m, today))
+    # Time matches must not re-use digits consumed by a date ("03/02/2026 18:00")
+    date_free = lowered
+    for _, regex in _DATE_PATTERNS[:4]:
+        date_free = regex.sub(lambda m: " " * len(m.group(0)), date_free)
+    times = _find_all(_TIME_PATTERNS, date_free, lambda k, m: _parse_time(k, m, "tonight" in lowered))
+
+    dates = list(dict.fromkeys(dates))
+    times = list(dict.fromkeys(times))
+
+    date = dates[0] if len(dates) == 1 else None
+    time = times[0] if len(times) == 1 else None
+
+    confident = (
+        date is not None
+        and time is not None
+        and not _UNSURE_RE.search(lowered)
+        and 0 <= (date - today).days <= MAX_DAYS_AHEAD
+        and datetime.datetime.combine(date, time) > now
+    )
+
+    return {"date": date, "time": time, "confident": confident}
+
+
+def _ordinal(n: int) -> str:
+    if 11 <= n % 100 <= 13:
+        return f"{n}th"
+    return f"{n}" + {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+
+
+def confirmation_reply(date: datetime.date, time: datetime.time) -> str:
+    """Templated confirmation in the same voice as the prompt's example."""
+    hour = time.hour % 12 or 12
+    when = f"{date.strftime('%B')} {_ordinal(date.day)}, {date.year} at {hour}:{time.minute:02d} {'AM' if time.hour < 12 else 'PM'}"
+    return f"Perfect! I've scheduled your appointment for {when}. Is this correct?"
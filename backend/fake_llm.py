@@ -0,0 +1,161 @@
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+from types import SimpleNamespace
+
+# --------------------------------------------------
+# Offline LLM stand-in
+# --------------------------------------------------
+# Drop-in for the parts of AsyncOpenAI that main.py uses
+# (`client.chat.completions.create`, streamed or not, and `close()`), with
+# scripted JSON replies, a configurable latency distribution and error rate.
+# Selected with LLM_PROVIDER=fake — for CI and load tests, no network needed.
+
+FAKE_LLM_LATENCY    = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.6,0.35")  # seconds
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SCRIPT     = os.getenv("FAKE_LLM_SCRIPT", "")  # JSON list of booking replies
+FAKE_LLM_CHUNK      = 8                                   # characters per streamed delta
+
+
+class FakeLLMError(Exception):
+    pass
+
+
+def parse_latency(spec: str):
+    """Latency sampler from "fixed:0.2", "uniform:0.1,0.5", "normal:0.5,0.1" or "lognormal:0.6,0.35"."""
+
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x]
+
+    if kind == "fixed":
+        return lambda: params[0]
+    if kind == "uniform":
+        return lambda: random.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        # parameterised by the median in seconds and the log-space sigma
+        mu = math.log(params[0])
+        return lambda: random.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def _default_booking_script() -> list:
+    day = datetime.date.today() + datetime.timedelta(days=7)
+    return [
+        {
+            "reply": "Thanks for reaching out! What date and time would suit you?",
+            "completed": False,
+            "appointment_date": None,
+            "appointment_time": None,
+        },
+        {
+            "reply": "We have mornings free most days next week. Which day and time would you like?",
+            "completed": False,
+            "appointment_date": None,
+            "appointment_time": None,
+        },
+        {
+            "reply": f"Perfect! I've scheduled your appointment for {day.strftime('%B %d, %Y')} at 10:00 AM. Is this correct?",
+            "completed": True,
+            "appointment_date": day.isoformat(),
+            "appointment_time": "10:00",
+        },
+    ]
+
+
+class _Completions:
+    def __init__(self, owner: "FakeAsyncOpenAI"):
+        self._owner = owner
+
+    async def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        owner = self._owner
+        owner.calls += 1
+
+        await asyncio.sleep(owner.latency())
+        if random.random() < owner.error_rate:
+            owner.errors += 1
+            raise FakeLLMError("Simulated upstream failure")
+
+        content = owner.reply_for(messages, kwargs.get("response_format"))
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(content) // 4,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+
+        if stream:
+            return self._stream(content, usage)
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    async def _stream(self, content: str, usage):
+        for i in range(0, len(content), FAKE_LLM_CHUNK):
+            await asyncio.sleep(0)
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + FAKE_LLM_CHUNK]))],
+                usage=None,
+            )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeAsyncOpenAI:
+    """Scripted, latency-shaped replacement for AsyncOpenAI."""
+
+    def __init__(self, latency: str = FAKE_LLM_LATENCY, error_rate: float = FAKE_LLM_ERROR_RATE,
+                 script_path: str = FAKE_LLM_SCRIPT):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+        if script_path:
+            with open(script_path) as f:
+                self.booking_script = json.load(f)
+        else:
+            self.booking_script = _default_booking_script()
+
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def reply_for(self, messages: list, response_format) -> str:
+        """Pick a canned reply shaped like what the real prompt asks for."""
+
+        system = messages[0].get("content") or ""
+        user = messages[-1].get("content") or ""
+
+        if '"reply"' in system:
+            # Booking: walk the script by assistant turns so far
+            turn = sum(1 for m in messages if m["role"] == "assistant")
+            return json.dumps(self.booking_script[min(turn, len(self.booking_script) - 1)])
+
+        if "feedback analyzer" in system:
+            analysis = {
+                "sentiment": "positive",
+                "rating": 4,
+                "summary": "The customer was happy with the service.",
+                "key_points": ["Friendly staff", "Quick service"],
+                "emotion": "satisfied",
+            }
+            if '"results"' in system:
+                items = json.loads(user)
+                return json.dumps({"results": [{"index": it["index"], **analysis} for it in items]})
+            return json.dumps(analysis)
+
+        if response_format:
+            return "{}"
+
+        # Rewrite / summary — plain text
+        return user.strip()[:400]
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors}
@@ -0,0 +1,55 @@
+"""Download the Kumbh Sans TTFs used by invoices into INVOICE_FONT_DIR.
+
+    cd backend
+    python fetch_fonts.py
+
+Run once per checkout or image build. The app never fetches fonts itself;
+without these files invoices fall back to Helvetica.
+"""
+import os
+import re
+import sys
+import urllib.request
+
+from invoice import _FONT_DIR, FONT_FILES
+
+# Old Chrome UA — Google Fonts returns TTF (not woff2) for this agent
+_UA = (
+    "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/534.30 "
+    "(KHTML, like Gecko) Chrome/12.0.742.122 Safari/534.30"
+)
+WEIGHTS = {"KumbhSans": 400, "KumbhSans-Bold": 700}
+
+
+def fetch_ttf(weight: int, dest: str) -> bool:
+    if os.path.exists(dest):
+        return True
+    try:
+        url = f"https://fonts.googleapis.com/css?family=Kumbh+Sans:{weight}"
+        req = urllib.request.Request(url, headers={"User-Agent": _UA})
+        css = urllib.request.urlopen(req, timeout=12).read().decode("utf-8")
+        m = re.search(r"url\(([^)]+\.ttf[^)]*)\)", css)
+        if not m:
+            return False
+        font_url = m.group(1).strip("'\"")
+        urllib.request.urlretrieve(font_url, dest)
+        return True
+    except Exception as exc:
+        print(f"[fonts] Download failed — {exc}")
+        return False
+
+
+def main():
+    os.makedirs(_FONT_DIR, exist_ok=True)
+    ok = True
+    for name, file in FONT_FILES.items():
+        dest = os.path.join(_FONT_DIR, file)
+        if fetch_ttf(WEIGHTS[name], dest):
+            print(f"[fonts] {dest}")
+        else:
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import jsonlog
+
+log = jsonlog.get_logger("history")
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+HISTORY_TOKEN_BUDGET  = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))   # verbatim history tokens
+HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "6"))     # always sent verbatim
+HISTORY_SUMMARY_EVERY = int(os.getenv("HISTORY_SUMMARY_EVERY", "4"))     # turns between summaries
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def message_tokens(messages: list) -> int:
+    # +4 per message for the role/separator framing the API adds
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+# --------------------------------------------------
+# History Manager
+# --------------------------------------------------
+class HistoryManager:
+    """Keeps the prompt history inside a token budget.
+
+    Recent messages are sent verbatim. Once the unsummarized tail grows past
+    the budget, older messages are folded into a rolling summary stored on
+    the session (`summary`, `summarized_upto`). Summarizing runs in the
+    background at most once every `summary_every` turns, so a normal turn
+    never waits on it.
+
+    `summarize(previous_summary, messages) -> str` is supplied by the caller.
+    """
+
+    def __init__(self, summarize, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 keep_messages: int = HISTORY_KEEP_MESSAGES,
+                 summary_every: int = HISTORY_SUMMARY_EVERY):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_messages = keep_messages
+        self.summary_every = summary_every
+        self._tasks: set = set()
+        self._running: set = set()      # session ids with a summary in flight
+
+    def window(self, session: dict) -> list:
+        """Messages to send after the system prompt.
+
+        The summary, then the unsummarized tail trimmed oldest-first to the
+        token budget (always keeping the latest message), so a summary that
+        lags or fails can't let the prompt grow without bound.
+        """
+
+        history = session["history"]
+        start = session.get("summarized_upto", 0)
+        messages = []
+
+        if session.get("summary"):
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {session['summary']}",
+            })
+
+        tail = history[start:]
+        used = 0
+        for keep in range(len(tail)):
+            used += message_tokens([tail[-1 - keep]])
+            if used > self.token_budget and keep:
+                tail = tail[len(tail) - keep:]
+                break
+
+        return messages + tail
+
+    def needs_summary(self, session: dict) -> bool:
+        history = session["history"]
+        start = session.get("summarized_upto", 0)
+        turns_since = (len(history) - session.get("summary_turn", 0)) // 2
+
+        return (
+            len(history) - start > self.keep_messages
+            and turns_since >= self.summary_every
+            and message_tokens(history[start:]) > self.token_budget
+        )
+
+    def maybe_summarize(self, session_id: str, session: dict, sessions):
+        """Schedule a background fold of old messages if the tail is over budget."""
+
+        if session_id in self._running or not self.needs_summary(session):
+            return
+
+        self._running.add(session_id)
+        task = asyncio.create_task(self._summarize(session_id, session, sessions))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: str, session: dict, sessions):
+        try:
+            await self._fold(session_id, session, sessions)
+        finally:
+            self._running.discard(session_id)
+
+    async def _fold(self, session_id: str, session: dict, sessions):
+        history = session["history"]
+        start = session.get("summarized_upto", 0)
+        cut = len(history) - self.keep_messages
+
+        try:
+            summary = await self.summarize(session.get("summary", ""), history[start:cut])
+        except Exception as e:
+            log.error("history_summary_failed", session_id=session_id, error=repr(e))
+            summary = None
+
+        # Re-read: another turn may have been saved while we were summarizing
+        session = await asyncio.to_thread(sessions.get, session_id)
+        if session is None:
+            return
+
+        # Only the summary fields, so a turn saved meanwhile isn't rolled back
+        fields = {"summary_turn": len(session["history"])}
+        if summary:
+            fields.update(summary=summary, summarized_upto=cut)
+        await asyncio.to_thread(sessions.update, session_id, **fields)
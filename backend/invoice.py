@@ -0,0 +1,443 @@
+import io
+import os
+import datetime
+
+import jsonlog
+
+# PDF
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.colors import HexColor
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+# This module pulls in ReportLab, so only the invoice worker processes import
+# it (see invoice_queue.py) — the API process never pays for the PDF stack.
+
+# --------------------------------------------------
+# Kumbh Sans font setup (local files, registered on first render)
+# --------------------------------------------------
+# Nothing is downloaded at runtime: put the TTFs in INVOICE_FONT_DIR (run
+# `python fetch_fonts.py` once, e.g. at image build) or invoices use Helvetica.
+_FONT_DIR = os.getenv(
+    "INVOICE_FONT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts"),
+)
+FONT_FILES = {
+    "KumbhSans":      "KumbhSans-Regular.ttf",
+    "KumbhSans-Bold": "KumbhSans-Bold.ttf",
+}
+_FONT_REG  = "Helvetica"       # fallback
+_FONT_BOLD = "Helvetica-Bold"  # fallback
+_fonts_ready = False
+
+log = jsonlog.get_logger("invoice")
+
+
+def _setup_fonts() -> None:
+    global _FONT_REG, _FONT_BOLD, _fonts_ready
+    if _fonts_ready:
+        return
+    _fonts_ready = True
+
+    paths = {name: os.path.join(_FONT_DIR, file) for name, file in FONT_FILES.items()}
+    missing = [p for p in paths.values() if not os.path.exists(p)]
+    if missing:
+        log.warning("fonts_missing", files=missing, fallback="Helvetica")
+        return
+
+    try:
+        for name, path in paths.items():
+            pdfmetrics.registerFont(TTFont(name, path))
+        _FONT_REG  = "KumbhSans"
+        _FONT_BOLD = "KumbhSans-Bold"
+        log.info("fonts_loaded", font="Kumbh Sans")
+    except Exception as exc:
+        log.error("fonts_failed", error=repr(exc), fallback="Helvetica")
+
+# --------------------------------------------------
+# Invoice Template  —  Kumbh Sans · Premium Design
+# --------------------------------------------------
+W, H = A4  # 595.28 × 841.89 pt
+
+CONTENT_W = W - 90  # 45 + 45 margins  → 505.28 pt
+COL1 = CONTENT_W * 0.34  # label column  ~172 pt
+COL2 = CONTENT_W * 0.66  # value column  ~333 pt
+
+# ── Palette ──────────────────────────────────────────────
+C_INDIGO_DEEP   = HexColor("#1E1B4B")   # very dark indigo  (table header bg)
+C_INDIGO_MID    = HexColor("#4F46E5")   # indigo            (accent bar, badges)
+C_CYAN          = HexColor("#06B6D4")   # cyan              (thin top stripe)
+C_INK           = HexColor("#0F172A")   # near-black        (primary text)
+C_DARK          = HexColor("#1E293B")   # dark slate        (secondary headings)
+C_MED           = HexColor("#334155")   # medium slate      (body text)
+C_SOFT          = HexColor("#64748B")   # muted slate       (labels, notes)
+C_BORDER        = HexColor("#CBD5E1")   # light border
+C_ROW_ALT       = HexColor("#F5F3FF")   # very light lavender (alt rows)
+C_ROW_LABEL     = HexColor("#F8FAFC")   # near-white        (label column bg)
+C_META_BG       = HexColor("#EEF2FF")   # light indigo      (meta info box)
+C_META_LINE     = HexColor("#C7D2FE")   # indigo tint       (meta box rules)
+C_GREEN_BG      = HexColor("#ECFDF5")   # light mint        (confirmed box bg)
+C_GREEN_TEXT    = HexColor("#065F46")   # dark emerald      (confirmed text)
+C_GREEN_BADGE   = HexColor("#059669")   # emerald           (confirmed accent)
+C_PAGE_BG       = HexColor("#FAFAFA")   # off-white page bg
+C_HEADER_BG     = HexColor("#FFFFFF")   # white             (header band)
+C_FOOTER_BG     = HexColor("#F1F5F9")   # light slate       (footer, notes box)
+C_FOOTER_TEXT   = HexColor("#94A3B8")   # pale slate        (footer small print)
+C_WHITE         = colors.white
+# ─────────────────────────────────────────────────────────
+
+_CHROME_FORM = "invoice_chrome"
+
+BOOKING_FIELDS = [
+    ("Store",             "store",            "—"),
+    ("Product / Service", "product",          "—"),
+    ("Service Details",   "details",          "—"),
+    ("Appointment Date",  "appointment_date", "To be confirmed"),
+    ("Appointment Time",  "appointment_time", "To be confirmed"),
+]
+
+
+class InvoiceTemplate:
+    """Everything on an invoice that does not depend on the booking.
+
+    Built once per process (see `get_template()`): paragraph styles, table
+    styles and the fully static tables live here, and the page header/footer
+    is drawn once per document as a PDF form XObject and stamped on each page.
+    Flowables are shared between builds, so a template must not be used by
+    two threads at once — invoices are rendered in worker processes.
+    """
+
+    def __init__(self, font_reg: str, font_bold: str):
+        self.font_reg = font_reg
+        self.font_bold = font_bold
+
+        # ── Paragraph styles ─────────────────────────────────
+        ps = self._ps
+        self.s_label     = ps("label",     bold=True,  size=8.5,  color=C_SOFT)
+        self.s_value     = ps("value",     bold=False, size=10.5, color=C_INK)
+        self.s_th        = ps("th",        bold=True,  size=9.5,  color=C_WHITE, align=TA_LEFT)
+        self.s_td_key    = ps("td_key",    bold=True,  size=10,   color=C_DARK)
+        self.s_td_val    = ps("td_val",    bold=False, size=10,   color=C_MED)
+        self.s_confirmed = ps("confirmed", bold=True,  size=13,   color=C_GREEN_TEXT, align=TA_CENTER)
+        self.s_conf_lbl  = ps("conf_lbl",  bold=True,  size=7.5,  color=C_GREEN_BADGE,
+                              align=TA_CENTER, space_after=3)
+        self.s_section   = ps("sh",        bold=True,  size=9,    color=C_INDIGO_MID)
+        self.s_notes     = ps("notes_p",   size=8.5,   color=C_SOFT, align=TA_CENTER, leading=13)
+
+        # ── Table styles ─────────────────────────────────────
+        self.meta_left_style = TableStyle([
+            ("BACKGROUND",    (0, 0), (-1, -1), C_META_BG),
+            ("TOPPADDING",    (0, 0), (-1, -1), 9),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 9),
+            ("LEFTPADDING",   (0, 0), (-1, -1), 14),
+            ("RIGHTPADDING",  (0, 0), (-1, -1), 14),
+            ("LINEBELOW",     (0, 0), (-1, -2), 0.5, C_META_LINE),
+            ("BOX",           (0, 0), (-1, -1), 0.8, C_META_LINE),
+            ("VALIGN",        (0, 0), (-1, -1), "MIDDLE"),
+        ])
+        self.outer_meta_style = TableStyle([
+            ("VALIGN",      (0, 0), (-1, -1), "MIDDLE"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 0),
+            ("RIGHTPADDING",(0, 0), (-1, -1), 0),
+            ("TOPPADDING",  (0, 0), (-1, -1), 0),
+            ("BOTTOMPADDING",(0, 0),(-1, -1), 0),
+        ])
+        self.booking_style = TableStyle(self._booking_style_cmds())
+
+        # ── Cached label paragraphs ──────────────────────────
+        self.meta_labels = [
+            Paragraph("INVOICE #", self.s_label),
+            Paragraph("DATE",      self.s_label),
+            Paragraph("TIME",      self.s_label),
+        ]
+        self.booking_header = [
+            Paragraph("Field",       self.s_th),
+            Paragraph("Information", self.s_th),
+        ]
+        self.booking_labels = [Paragraph(label, self.s_td_key) for label, _, _ in BOOKING_FIELDS]
+
+        # ── Fully static tables ──────────────────────────────
+        # Right: CONFIRMED badge
+        self.meta_right = Table(
+            [[Paragraph("BOOKING STATUS", self.s_conf_lbl)],
+             [Paragraph("CONFIRMED",      self.s_confirmed)]],
+            colWidths=[1.85 * inch],
+        )
+        self.meta_right.setStyle(TableStyle([
+            ("BACKGROUND",    (0, 0), (0, 0), C_GREEN_BADGE),
+            ("BACKGROUND",    (0, 1), (0, 1), C_GREEN_BG),
+            ("TOPPADDING",    (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+            ("ALIGN",         (0, 0), (-1, -1), "CENTER"),
+            ("BOX",           (0, 0), (-1, -1), 1.2, C_GREEN_BADGE),
+            ("LINEBELOW",     (0, 0), (0, 0),   1.5, C_GREEN_BADGE),
+        ]))
+
+        # Section header: indigo left-bar accent + title on light-indigo background
+        self.section_hdr = Table(
+            [["", Paragraph("BOOKING DETAILS", self.s_section)]],
+            colWidths=[5, CONTENT_W - 5],
+        )
+        self.section_hdr.setStyle(TableStyle([
+            ("BACKGROUND",    (0, 0), (0, 0), C_INDIGO_MID),
+            ("BACKGROUND",    (1, 0), (1, 0), C_META_BG),
+            ("TOPPADDING",    (0, 0), (-1, -1), 9),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 9),
+            ("LEFTPADDING",   (1, 0), (1, 0), 13),
+            ("LEFTPADDING",   (0, 0), (0, 0), 0),
+            ("RIGHTPADDING",  (0, 0), (-1, -1), 12),
+            ("VALIGN",        (0, 0), (-1, -1), "MIDDLE"),
+        ]))
+
+        self.notes_table = Table(
+            [[Paragraph(
+                "<b>Important:</b>  Bring this invoice to your appointment. "
+                "For changes or cancellations please contact the store at least "
+                "24 hours in advance.",
+                self.s_notes,
+            )]],
+            colWidths=[CONTENT_W],
+        )
+        self.notes_table.setStyle(TableStyle([
+            ("BACKGROUND",    (0, 0), (-1, -1), C_FOOTER_BG),
+            ("BOX",           (0, 0), (-1, -1), 0.6, C_BORDER),
+            ("TOPPADDING",    (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+            ("LEFTPADDING",   (0, 0), (-1, -1), 18),
+            ("RIGHTPADDING",  (0, 0), (-1, -1), 18),
+        ]))
+
+    def _ps(self, name, font=None, size=10, color=None, align=TA_LEFT,
+            leading=None, space_before=0, space_after=0, bold=False):
+        fn = font or (self.font_bold if bold else self.font_reg)
+        return ParagraphStyle(
+            name,
+            fontName=fn,
+            fontSize=size,
+            textColor=color or C_MED,
+            alignment=align,
+            leading=leading or (size * 1.45),
+            spaceBefore=space_before,
+            spaceAfter=space_after,
+        )
+
+    def _booking_style_cmds(self) -> list:
+        cmds = [
+            ("BACKGROUND",    (0, 0), (-1, 0), C_INDIGO_DEEP),
+            ("TEXTCOLOR",     (0, 0), (-1, 0), C_WHITE),
+            ("TOPPADDING",    (0, 0), (-1, 0), 13),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 13),
+            ("LEFTPADDING",   (0, 0), (-1, 0), 15),
+            ("RIGHTPADDING",  (0, 0), (-1, 0), 15),
+            ("LINEBELOW",     (0, 0), (-1, 0), 2.5, C_INDIGO_MID),
+        ]
+
+        for i in range(len(BOOKING_FIELDS)):
+            bg = C_ROW_ALT if i % 2 == 1 else C_WHITE
+            ri = i + 1
+            cmds += [
+                ("BACKGROUND",    (0, ri), (0, ri),  C_ROW_LABEL),
+                ("BACKGROUND",    (1, ri), (1, ri),  bg),
+                ("TOPPADDING",    (0, ri), (-1, ri), 11),
+                ("BOTTOMPADDING", (0, ri), (-1, ri), 11),
+                ("LEFTPADDING",   (0, ri), (-1, ri), 15),
+                ("RIGHTPADDING",  (0, ri), (-1, ri), 15),
+            ]
+
+        cmds += [
+            ("FONTNAME",  (0, 1), (-1, -1), self.font_reg),
+            ("GRID",      (0, 0), (-1, -1), 0.5, C_BORDER),
+            ("BOX",       (0, 0), (-1, -1), 1.2, C_BORDER),
+            ("VALIGN",    (0, 0), (-1, -1), "MIDDLE"),
+        ]
+        return cmds
+
+    # ── Canvas decorations (header + footer) ─────────────────
+    def _draw_chrome(self, c: canvas.Canvas):
+        """Static page chrome — recorded once per document into a form XObject."""
+
+        # ── Subtle off-white page background ──
+        c.setFillColor(C_PAGE_BG)
+        c.rect(0, 0, W, H, fill=1, stroke=0)
+
+        # ── Top accent bar: indigo (left 65 %) + cyan (right 35 %) ──
+        c.setFillColor(C_INDIGO_MID)
+        c.rect(0, H - 6, W * 0.65, 6, fill=1, stroke=0)
+        c.setFillColor(C_CYAN)
+        c.rect(W * 0.65, H - 6, W * 0.35, 6, fill=1, stroke=0)
+
+        # ── Header background (very subtle) ──
+        c.setFillColor(C_HEADER_BG)
+        c.rect(0, H - 88, W, 82, fill=1, stroke=0)
+
+        # ── Logo badge (filled circle) ──
+        c.setFillColor(C_INDIGO_MID)
+        c.circle(62, H - 44, 20, fill=1, stroke=0)
+        c.setFillColor(C_WHITE)
+        c.setFont(self.font_bold, 11)
+        c.drawCentredString(62, H - 49, "AI")
+
+        # ── Company name + tagline ──
+        c.setFillColor(C_INK)
+        c.setFont(self.font_bold, 15)
+        c.drawString(92, H - 35, "AI VOICE ASSISTANT")
+
+        c.setFillColor(C_SOFT)
+        c.setFont(self.font_reg, 8.5)
+        c.drawString(92, H - 52, "Intelligent Booking & Appointment System")
+
+        # ── INVOICE label (right-aligned) ──
+        c.setFillColor(C_SOFT)
+        c.setFont(self.font_reg, 7.5)
+        c.drawRightString(W - 45, H - 30, "B O O K I N G   I N V O I C E")
+
+        # ── Header bottom rule ──
+        c.setStrokeColor(C_BORDER)
+        c.setLineWidth(0.75)
+        c.line(45, H - 78, W - 45, H - 78)
+
+        # ── Thin indigo accent left-side rule (decorative) ──
+        c.setStrokeColor(C_INDIGO_MID)
+        c.setLineWidth(2.5)
+        c.line(45, H - 82, 45, H - 78)
+
+        # ── Footer background ──
+        c.setFillColor(C_FOOTER_BG)
+        c.rect(0, 0, W, 50, fill=1, stroke=0)
+        c.setStrokeColor(C_BORDER)
+        c.setLineWidth(0.6)
+        c.line(0, 50, W, 50)
+
+        # ── Footer accent bar ──
+        c.setFillColor(C_INDIGO_MID)
+        c.rect(0, 48, W * 0.65, 2, fill=1, stroke=0)
+        c.setFillColor(C_CYAN)
+        c.rect(W * 0.65, 48, W * 0.35, 2, fill=1, stroke=0)
+
+        # ── Footer text ──
+        c.setFillColor(C_SOFT)
+        c.setFont(self.font_bold, 8)
+        c.drawCentredString(W / 2, 32, "AI Voice Assistant  ·  Intelligent Booking & Appointment System")
+        c.setFont(self.font_reg, 7.5)
+        c.setFillColor(C_FOOTER_TEXT)
+        c.drawCentredString(
+            W / 2, 16,
+            "Thank you for choosing our service. Bring this invoice to your appointment."
+        )
+
+    def decorate_page(self, c: canvas.Canvas, doc):
+        """onPage hook: stamp the chrome form, then the per-invoice number."""
+
+        c.saveState()
+
+        if not c.hasForm(_CHROME_FORM):
+            c.beginForm(_CHROME_FORM)
+            self._draw_chrome(c)
+            c.endForm()
+        c.doForm(_CHROME_FORM)
+
+        # ── Invoice number ──
+        c.setFillColor(C_INDIGO_MID)
+        c.setFont(self.font_bold, 11)
+        c.drawRightString(W - 45, H - 49, f"# {doc.invoice_number}")
+
+        c.restoreState()
+
+    def elements(self, session_id: str, session_data: dict, now: datetime.datetime) -> list:
+        """Flowables for one invoice — only the per-session cells are new."""
+
+        elements = []
+
+        # ── ① Meta info row (invoice details | status badge) ────
+        meta_values = [session_id, now.strftime("%B %d, %Y"), now.strftime("%I:%M %p")]
+        meta_left = Table(
+            [[label, Paragraph(value, self.s_value)]
+             for label, value in zip(self.meta_labels, meta_values)],
+            colWidths=[0.9 * inch, 2.5 * inch],
+        )
+        meta_left.setStyle(self.meta_left_style)
+
+        outer_meta = Table(
+            [[meta_left, "", self.meta_right]],
+            colWidths=[3.55 * inch, 0.25 * inch, 1.85 * inch],
+        )
+        outer_meta.setStyle(self.outer_meta_style)
+
+        elements.append(outer_meta)
+        elements.append(Spacer(1, 0.32 * inch))
+
+        # ── ② Section header: BOOKING DETAILS ───────────────────
+        elements.append(self.section_hdr)
+        elements.append(Spacer(1, 4))
+
+        # ── ③ Booking details table ──────────────────────────────
+        table_data = [self.booking_header]
+        for label, (_, key, default) in zip(self.booking_labels, BOOKING_FIELDS):
+            value = session_data.get(key, default)
+            table_data.append([label, Paragraph(value or "—", self.s_td_val)])
+
+        booking_table = Table(table_data, colWidths=[COL1, COL2])
+        booking_table.setStyle(self.booking_style)
+        elements.append(booking_table)
+        elements.append(Spacer(1, 0.35 * inch))
+
+        # ── ④ Notes ──────────────────────────────────────────────
+        elements.append(self.notes_table)
+
+        return elements
+
+
+_template = None
+
+
+def get_template() -> InvoiceTemplate:
+    """The process-wide invoice template, built on first use."""
+    global _template
+    if _template is None:
+        _setup_fonts()
+        _template = InvoiceTemplate(_FONT_REG, _FONT_BOLD)
+    return _template
+
+
+# --------------------------------------------------
+# Invoice Generator
+# --------------------------------------------------
+def render_invoice(session_id: str, session_data: dict, template: InvoiceTemplate = None) -> bytes:
+    """Render one invoice into memory and return the PDF bytes.
+
+    The invoice is dated `session_data["issued_at"]` (ISO format) when
+    present, so a re-render keeps the original date; otherwise now.
+    """
+
+    buffer = io.BytesIO()
+    template = template or get_template()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        topMargin=100,
+        bottomMargin=62,
+        leftMargin=45,
+        rightMargin=45,
+    )
+    doc.invoice_number = session_id
+
+    issued_at = session_data.get("issued_at")
+    # Stored in UTC (older sessions: naive local); printed in local time as before
+    now = datetime.datetime.fromisoformat(issued_at).astimezone() if issued_at else datetime.datetime.now()
+    elements = template.elements(session_id, session_data, now)
+
+    # ── Build ─────────────────────────────────────────────────
+    doc.build(
+        elements,
+        onFirstPage=template.decorate_page,
+        onLaterPages=template.decorate_page,
+    )
+
+    return buffer.getvalue()
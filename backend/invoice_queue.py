@@ -0,0 +1,97 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from profiler import profiler, sample_call
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "2"))
+
+
+def _render(session_id: str, session_data: dict) -> bytes:
+    # Runs in a worker: ReportLab and the fonts load there on the first
+    # invoice, never in the API process
+    from invoice import render_invoice
+    return render_invoice(session_id, session_data)
+
+
+def _render_profiled(session_id: str, session_data: dict, interval: float) -> tuple:
+    # While a profile runs, the worker samples itself and ships the stacks back
+    return sample_call(_render, session_id, session_data, interval=interval)
+
+
+# --------------------------------------------------
+# Invoice render queue
+# --------------------------------------------------
+class InvoiceQueue:
+    """Renders invoices in a small process pool, off the API event loop.
+
+    At most `workers` renders run at once; further jobs wait here (not in the
+    pool) so `queued` is the real backlog a burst of finished bookings creates.
+    """
+
+    def __init__(self, workers: int = INVOICE_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._tasks: set = set()
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, session_id: str, session_data: dict) -> bytes:
+        """Render one invoice and return the PDF bytes."""
+
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            self.running += 1
+            try:
+                loop = asyncio.get_running_loop()
+                if profiler.active:
+                    pdf, stacks = await loop.run_in_executor(
+                        self._pool(), _render_profiled, session_id, session_data, profiler.interval
+                    )
+                    profiler.merge(stacks)
+                else:
+                    pdf = await loop.run_in_executor(
+                        self._pool(), _render, session_id, session_data
+                    )
+                self.completed += 1
+                return pdf
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.running -= 1
+
+    def submit(self, coro) -> asyncio.Task:
+        """Run a render job in the background, keeping a reference until it ends."""
+
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,190 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+LOG_LEVEL      = os.getenv("LOG_LEVEL", "info").lower()
+LOG_SAMPLE     = os.getenv("LOG_SAMPLE", "")           # "/session/message=0.1,/feedback=0.5"
+LOG_REDACT     = os.getenv("LOG_REDACT", "1") == "1"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_FILE       = os.getenv("LOG_FILE", "")             # "" = stdout
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+# Fields that can carry what a customer typed or what the model said back,
+# or a one-time code that would let anyone reading the log verify an account
+REDACTED_FIELDS = {
+    "message", "text", "content", "reply", "raw", "summary",
+    "feedback", "improved_text", "assistant_message", "history",
+    "otp",
+}
+
+
+def _parse_sample(spec: str) -> dict:
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        route, _, rate = part.rpartition("=")
+        rates[route] = float(rate)
+    return rates
+
+
+def redact(value):
+    """Replace customer/model text with its length, at any depth."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in REDACTED_FIELDS and v:
+                out[k] = f"<redacted {len(v) if isinstance(v, (str, list)) else '?'}>"
+            else:
+                out[k] = redact(v)
+        return out
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+# --------------------------------------------------
+# Background writer
+# --------------------------------------------------
+class LogWriter:
+    """Bounded queue of records drained by one writer thread.
+
+    Callers only build a small dict and `put_nowait` it; JSON encoding,
+    redaction and the write happen on the writer thread. When the queue is
+    full the record is dropped and counted instead of blocking the caller.
+    """
+
+    def __init__(self, path: str = LOG_FILE, max_queue: int = LOG_QUEUE_SIZE, redact_fields: bool = LOG_REDACT):
+        self.path = path
+        self.max_queue = max_queue
+        self.redact_fields = redact_fields
+        self._lock = threading.Lock()
+        self._pid = None
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked child (the thread doesn't survive a fork)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._out = open(self.path, "a", buffering=1) if self.path else sys.stdout
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def emit(self, record: dict):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        q, out = self._queue, self._out
+        while True:
+            record = q.get()
+            if record is None:
+                out.flush()
+                return
+            try:
+                record["ts"] = datetime.datetime.fromtimestamp(
+                    record["ts"], datetime.timezone.utc
+                ).isoformat(timespec="milliseconds")
+                if self.redact_fields:
+                    record = redact(record)
+                out.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+                self.written += 1
+            except Exception:
+                self.dropped += 1
+            if q.empty():
+                out.flush()
+
+    def shutdown(self, timeout: float = 2.0):
+        """Write out what is queued, then stop the thread."""
+        if self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+_writer = LogWriter()
+atexit.register(_writer.shutdown)
+
+
+# --------------------------------------------------
+# Logger
+# --------------------------------------------------
+class Logger:
+    """`log.info("event", key=value, ...)` → one JSON line.
+
+    Records at info and below that carry a `route` are sampled by the rate
+    LOG_SAMPLE gives that route; warnings and errors are always kept.
+    """
+
+    def __init__(self, name: str, level: str = LOG_LEVEL, sample: dict = None):
+        self.name = name
+        self.level = LEVELS.get(level, 20)
+        self.sample = _parse_sample(LOG_SAMPLE) if sample is None else sample
+
+    def _log(self, level: str, event: str, fields: dict):
+        severity = LEVELS[level]
+        if severity < self.level:
+            return
+        if severity < 30 and self.sample:
+            rate = self.sample.get(fields.get("route"), 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return
+        _writer.emit({
+            "ts": time.time(),   # formatted on the writer thread
+            "level": level,
+            "logger": self.name,
+            "event": event,
+            **fields,
+        })
+
+    def debug(self, event: str, **fields):
+        self._log("debug", event, fields)
+
+    def info(self, event: str, **fields):
+        self._log("info", event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log("warning", event, fields)
+
+    def error(self, event: str, **fields):
+        self._log("error", event, fields)
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self.level
+
+
+def get_logger(name: str) -> Logger:
+    return Logger(name)
+
+
+def shutdown():
+    _writer.shutdown()
+
+
+def stats() -> dict:
+    return _writer.stats()
@@ -0,0 +1,224 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+
+import jsonlog
+
+log = jsonlog.get_logger("mail")
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+OUTBOX_MAX_QUEUE    = int(os.getenv("OUTBOX_MAX_QUEUE", "1000"))
+OUTBOX_BATCH_SIZE   = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))      # messages per connection check
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF      = float(os.getenv("OUTBOX_BACKOFF", "0.5"))      # seconds, doubled per retry
+OUTBOX_IDLE_CLOSE   = float(os.getenv("OUTBOX_IDLE_CLOSE", "60"))    # drop the connection after this long idle
+
+
+class SmtpSettings:
+    """Where and how to send, read from the environment once at startup.
+
+    GMAIL_USER / GMAIL_APP_PASSWORD alone keep the old behaviour (Gmail over
+    SSL on 465). SMTP_HOST, SMTP_PORT and SMTP_SECURITY (ssl | starttls |
+    none) point the outbox anywhere else. SMTP_SECURITY defaults to ssl on
+    port 465 and starttls otherwise; "none" has to be asked for, for a local
+    stand-in, and is refused with credentials so a login never goes out in
+    the clear:
+
+        python -m aiosmtpd -n -l localhost:8025
+        SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SECURITY=none uvicorn main:app
+
+    With neither credentials nor SMTP_HOST, mail is not sent and the OTP is
+    printed instead (dev mode).
+    """
+
+    def __init__(self, host: str = "", port: int = 0, security: str = "",
+                 user: str = "", password: str = "", sender: str = ""):
+        self.user = user
+        self.password = password
+        self.host = host or ("smtp.gmail.com" if user and password else "")
+        self.security = security or ("ssl" if not host or port == 465 else "starttls")
+        if self.security not in ("ssl", "starttls", "none"):
+            raise ValueError(f"Unknown SMTP_SECURITY: {security}")
+        if self.security == "none" and (user or password):
+            raise ValueError("SMTP_SECURITY=none would send the SMTP login in plain text")
+        self.port = port or {"ssl": 465, "starttls": 587}.get(self.security, 25)
+        self.sender = sender or user or "no-reply@localhost"
+
+    @classmethod
+    def from_env(cls) -> "SmtpSettings":
+        return cls(
+            host=os.getenv("SMTP_HOST", ""),
+            port=int(os.getenv("SMTP_PORT", "0")),
+            security=os.getenv("SMTP_SECURITY", ""),
+            user=os.getenv("SMTP_USER") or os.getenv("GMAIL_USER") or "",
+            password=os.getenv("SMTP_PASSWORD") or os.getenv("GMAIL_APP_PASSWORD") or "",
+            sender=os.getenv("SMTP_FROM", ""),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+
+# --------------------------------------------------
+# Outbox
+# --------------------------------------------------
+class MailOutbox:
+    """Queue of outgoing mail drained by one background sender thread.
+
+    `send()` only enqueues, so request handlers never wait on SMTP. The
+    sender keeps one connection open between messages, checks it once per
+    batch, reconnects when the server has dropped it, and retries a failed
+    message with exponential backoff before giving up on it.
+    """
+
+    def __init__(self, settings: SmtpSettings = None, max_queue: int = OUTBOX_MAX_QUEUE,
+                 batch_size: int = OUTBOX_BATCH_SIZE, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 backoff: float = OUTBOX_BACKOFF, idle_close: float = OUTBOX_IDLE_CLOSE):
+        self.settings = settings
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_close = idle_close
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._conn = None
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.connects = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def start(self, settings: SmtpSettings = None):
+        """Load settings (from the environment unless given) and start the sender."""
+
+        self.settings = settings or self.settings or SmtpSettings.from_env()
+        if self._thread is None and self.settings.configured:
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread.start()
+
+    @property
+    def configured(self) -> bool:
+        return self.settings is not None and self.settings.configured
+
+    def send(self, to_email: str, msg: Message) -> bool:
+        """Queue a message. Returns False when the outbox is full."""
+
+        if "From" not in msg:
+            msg["From"] = self.settings.sender
+        msg["To"] = to_email
+        try:
+            self._queue.put_nowait((to_email, msg))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is already queued (up to `timeout`), then close the connection."""
+
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ---- sender thread ----
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_close)
+            except queue.Empty:
+                self._disconnect()
+                continue
+
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            stopping = batch[-1] is None
+            batch = [m for m in batch if m is not None]
+            if batch:
+                self.batches += 1
+                self._check_connection()
+                for to_email, msg in batch:
+                    self._deliver(to_email, msg)
+
+            if stopping:
+                self._disconnect()
+                return
+
+    def _deliver(self, to_email: str, msg: Message):
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.retries += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                if self._conn is None:
+                    self._connect()
+                self._conn.sendmail(self.settings.sender, [to_email], msg.as_string())
+                self.sent += 1
+                log.info("mail_sent", to=to_email, attempt=attempt + 1)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                log.warning("mail_failed", to=to_email, attempt=attempt + 1, error=repr(e))
+                if isinstance(e, smtplib.SMTPRecipientsRefused):
+                    break   # the server said no to this address; retrying won't change that
+                self._disconnect()
+        self.failed += 1
+
+    def _connect(self):
+        s = self.settings
+        if s.security == "ssl":
+            conn = smtplib.SMTP_SSL(s.host, s.port, timeout=15)
+        else:
+            conn = smtplib.SMTP(s.host, s.port, timeout=15)
+            if s.security == "starttls":
+                conn.starttls()
+        if s.user and s.password:
+            conn.login(s.user, s.password)
+        self._conn = conn
+        self.connects += 1
+
+    def _check_connection(self):
+        """Servers drop idle connections; find out before the first send of a batch."""
+        if self._conn is None:
+            return
+        try:
+            if self._conn.noop()[0] != 250:
+                self._disconnect()
+        except (smtplib.SMTPException, OSError):
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            "configured": self.configured,
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "connects": self.connects,
+            "batches": self.batches,
+        }
@@ -1,89 +1,137 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
-from typing import Dict
+from typing import List
+from contextlib import asynccontextmanager
 import os
-import re as _re
 import json
+import time
+import asyncio
 import datetime
-import urllib.request
+import socket
+from email.utils import formatdate
 from dotenv import load_dotenv
-from openai import OpenAI
-from auth import router as auth_router
-
-# PDF
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.colors import HexColor
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-# --------------------------------------------------
-# Kumbh Sans font setup (download once, cache locally)
-# --------------------------------------------------
-_FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
-_FONT_REG  = "Helvetica"       # fallback
-_FONT_BOLD = "Helvetica-Bold"  # fallback
-
-def _setup_fonts() -> None:
-    global _FONT_REG, _FONT_BOLD
-    os.makedirs(_FONT_DIR, exist_ok=True)
-    r_path = os.path.join(_FONT_DIR, "KumbhSans-Regular.ttf")
-    b_path = os.path.join(_FONT_DIR, "KumbhSans-Bold.ttf")
-
-    # Old Chrome UA — Google Fonts returns TTF (not woff2) for this agent
-    _ua = (
-        "Mozilla/5.0 (Windows NT 6.1) AppleWebKit/534.30 "
-        "(KHTML, like Gecko) Chrome/12.0.742.122 Safari/534.30"
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+
+# --------------------------------------------------
+# Load Environment
+# --------------------------------------------------
+# Before the local imports: they read their config from os.environ at import time
+load_dotenv()
+
+from auth import router as auth_router, hasher as password_hasher, outbox as mail_outbox, pending_registrations, require_admin, is_admin_key
+from reply_stream import ReplyExtractor, sse_event
+from invoice_queue import InvoiceQueue
+from blob_store import RetentionSweeper, create_blob_store, issue_day, stream_zip
+from session_store import create_session_store
+from history import HistoryManager, message_tokens
+from date_parser import extract_appointment, confirmation_reply
+from response_cache import ResponseCache, cache_key
+import jsonlog
+import metrics
+from profiler import ProfileMiddleware, profiler
+
+log = jsonlog.get_logger("main")
+
+# --------------------------------------------------
+# OpenAI client  —  one pooled async client per worker
+# --------------------------------------------------
+# Every route awaits the LLM on the event loop, so concurrency is bounded by
+# the connection pool below rather than by the Starlette threadpool.
+LLM_MAX_CONNECTIONS    = int(os.getenv("LLM_MAX_CONNECTIONS", "500"))
+LLM_MAX_KEEPALIVE      = int(os.getenv("LLM_MAX_KEEPALIVE", "100"))
+LLM_KEEPALIVE_EXPIRY   = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT    = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT            = float(os.getenv("LLM_TIMEOUT", "30"))           # per call
+LLM_MAX_RETRIES        = int(os.getenv("LLM_MAX_RETRIES", "2"))
+# "fake" swaps in the offline stand-in from fake_llm.py (CI, load tests)
+LLM_PROVIDER           = os.getenv("LLM_PROVIDER", "openai")             # openai | fake
+
+
+def create_llm_client():
+    """The provider behind every `client.chat.completions.create` call."""
+
+    if LLM_PROVIDER == "fake":
+        from fake_llm import FakeAsyncOpenAI
+        return FakeAsyncOpenAI()
+
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=LLM_MAX_RETRIES,
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        ),
     )
 
-    def _fetch_ttf(weight: int, dest: str) -> bool:
-        if os.path.exists(dest):
-            return True
-        try:
-            url = f"https://fonts.googleapis.com/css?family=Kumbh+Sans:{weight}"
-            req = urllib.request.Request(url, headers={"User-Agent": _ua})
-            css = urllib.request.urlopen(req, timeout=12).read().decode("utf-8")
-            m = _re.search(r"url\(([^)]+\.ttf[^)]*)\)", css)
-            if not m:
-                return False
-            font_url = m.group(1).strip("'\"")
-            urllib.request.urlretrieve(font_url, dest)
-            return True
-        except Exception as exc:
-            print(f"[fonts] Download failed — {exc}")
-            return False
-
-    if _fetch_ttf(400, r_path) and _fetch_ttf(700, b_path):
-        try:
-            pdfmetrics.registerFont(TTFont("KumbhSans",      r_path))
-            pdfmetrics.registerFont(TTFont("KumbhSans-Bold", b_path))
-            _FONT_REG  = "KumbhSans"
-            _FONT_BOLD = "KumbhSans-Bold"
-            print("[fonts] Kumbh Sans loaded OK")
-        except Exception as exc:
-            print(f"[fonts] Registration failed — {exc}; falling back to Helvetica")
-    else:
-        print("[fonts] Using Helvetica fallback")
 
-_setup_fonts()
+client = create_llm_client()
+
+
+async def _complete(route: str, **kwargs):
+    """A non-streaming LLM call, counted in the in-flight, latency and token metrics."""
+
+    with metrics.llm_in_flight.track(), metrics.stage(route, "llm"):
+        response = await client.chat.completions.create(**kwargs)
+    metrics.count_tokens(response.usage)
+    return response
+
 
 # --------------------------------------------------
-# Load Environment
+# Invoice render queue (process pool)
 # --------------------------------------------------
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+invoice_queue = InvoiceQueue()
+
+
+INVOICE_CLAIM_LEASE = float(os.getenv("INVOICE_CLAIM_LEASE", "60"))   # seconds before an unfinished render is retried
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _requeue_pending_invoices():
+    # A restart (or a dead worker) interrupted these renders; persisted
+    # sessions still say "pending". Each is claimed in the store before it
+    # is rendered, and one claimed within the lease — a live worker is
+    # rendering it — is left alone
+    while True:
+        try:
+            claimed = await asyncio.to_thread(sessions.claim_pending_invoices, WORKER_ID, INVOICE_CLAIM_LEASE)
+            for session_id, session in claimed:
+                invoice_queue.submit(_render_invoice(session_id, session))
+            if claimed:
+                log.info("invoices_requeued", count=len(claimed), worker=WORKER_ID)
+        except Exception as e:
+            log.error("invoice_requeue_failed", error=repr(e))
+        await asyncio.sleep(INVOICE_CLAIM_LEASE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mail_outbox.start()
+    pending_registrations.start()
+    invoice_retention.start()
+    requeue = asyncio.create_task(_requeue_pending_invoices())
+    yield
+    requeue.cancel()
+    await client.close()
+    invoice_queue.shutdown()
+    password_hasher.shutdown()
+    mail_outbox.stop()
+    pending_registrations.stop()
+    invoice_retention.stop()
+    jsonlog.shutdown()
 
 # --------------------------------------------------
 # FastAPI App
 # --------------------------------------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(auth_router)
 
@@ -98,18 +146,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfileMiddleware, authorize=is_admin_key)
+
+# Outermost, so request timings include everything below it
+app.add_middleware(metrics.MetricsMiddleware)
+
 # --------------------------------------------------
-# Invoice Folder
+# Invoice Storage  —  see blob_store.py (INVOICE_STORE=local|memory)
 # --------------------------------------------------
-if not os.path.exists("invoices"):
-    os.makedirs("invoices")
-
-app.mount("/invoices", StaticFiles(directory="invoices"), name="invoices")
+invoice_store = create_blob_store()
+invoice_retention = RetentionSweeper(invoice_store)
+INVOICE_BASE_URL = os.getenv("INVOICE_BASE_URL", "http://localhost:8001")
 
 # --------------------------------------------------
-# Session Storage
+# Session Storage  —  see session_store.py (SESSION_BACKEND=memory|sqlite)
 # --------------------------------------------------
-sessions: Dict[str, dict] = {}
+sessions = create_session_store()
+
+metrics.sessions_active.set_function(lambda: len(sessions))
+metrics.pending_registrations.set_function(lambda: len(pending_registrations))
 
 # --------------------------------------------------
 # Models
@@ -125,346 +180,25 @@ class MessageRequest(BaseModel):
     message: str
 
 
-# --------------------------------------------------
-# Invoice Generator  —  Kumbh Sans · Premium Design
-# --------------------------------------------------
-def generate_invoice(session_id: str, session_data: dict):
-
-    filename = f"invoices/{session_id}.pdf"
-    W, H = A4  # 595.28 × 841.89 pt
-
-    # ── Palette ──────────────────────────────────────────────
-    C_INDIGO_DEEP   = HexColor("#1E1B4B")   # very dark indigo  (table header bg)
-    C_INDIGO_MID    = HexColor("#4F46E5")   # indigo            (accent bar, badges)
-    C_CYAN          = HexColor("#06B6D4")   # cyan              (thin top stripe)
-    C_INK           = HexColor("#0F172A")   # near-black        (primary text)
-    C_DARK          = HexColor("#1E293B")   # dark slate        (secondary headings)
-    C_MED           = HexColor("#334155")   # medium slate      (body text)
-    C_SOFT          = HexColor("#64748B")   # muted slate       (labels, notes)
-    C_BORDER        = HexColor("#CBD5E1")   # light border
-    C_ROW_ALT       = HexColor("#F5F3FF")   # very light lavender (alt rows)
-    C_ROW_LABEL     = HexColor("#F8FAFC")   # near-white        (label column bg)
-    C_META_BG       = HexColor("#EEF2FF")   # light indigo      (meta info box)
-    C_GREEN_BG      = HexColor("#ECFDF5")   # light mint        (confirmed box bg)
-    C_GREEN_TEXT    = HexColor("#065F46")   # dark emerald      (confirmed text)
-    C_GREEN_BADGE   = HexColor("#059669")   # emerald           (confirmed accent)
-    C_PAGE_BG       = HexColor("#FAFAFA")   # off-white page bg
-    C_WHITE         = colors.white
-    # ─────────────────────────────────────────────────────────
-
-    now       = datetime.datetime.now()
-    date_str  = now.strftime("%B %d, %Y")
-    time_str  = now.strftime("%I:%M %p")
-
-    # ── Paragraph styles ─────────────────────────────────────
-    def ps(name, font=None, size=10, color=None, align=TA_LEFT,
-           leading=None, space_before=0, space_after=0, bold=False):
-        fn = font or (_FONT_BOLD if bold else _FONT_REG)
-        return ParagraphStyle(
-            name,
-            fontName=fn,
-            fontSize=size,
-            textColor=color or C_MED,
-            alignment=align,
-            leading=leading or (size * 1.45),
-            spaceBefore=space_before,
-            spaceAfter=space_after,
-        )
-
-    s_label     = ps("label",     bold=True,  size=8.5,  color=C_SOFT)
-    s_value     = ps("value",     bold=False, size=10.5, color=C_INK)
-    s_th        = ps("th",        bold=True,  size=9.5,  color=C_WHITE, align=TA_LEFT)
-    s_td_key    = ps("td_key",    bold=True,  size=10,   color=C_DARK)
-    s_td_val    = ps("td_val",    bold=False, size=10,   color=C_MED)
-    s_confirmed = ps("confirmed", bold=True,  size=13,   color=C_GREEN_TEXT, align=TA_CENTER)
-    s_conf_lbl  = ps("conf_lbl",  bold=True,  size=7.5,  color=C_GREEN_BADGE,
-                     align=TA_CENTER, space_after=3)
-    s_note      = ps("note",      bold=False, size=8.5,  color=C_SOFT, align=TA_CENTER,
-                     leading=14, space_after=3)
-    s_note_bold = ps("note_b",    bold=True,  size=8.5,  color=C_SOFT, align=TA_CENTER)
-    # ─────────────────────────────────────────────────────────
-
-    def _cell(text, style, pad_t=11, pad_b=11, pad_l=14, pad_r=14):
-        """Wrap paragraph in single-cell table for consistent padding."""
-        t = Table([[Paragraph(text, style)]], colWidths=None)
-        t.setStyle(TableStyle([
-            ("TOPPADDING",    (0,0), (-1,-1), pad_t),
-            ("BOTTOMPADDING", (0,0), (-1,-1), pad_b),
-            ("LEFTPADDING",   (0,0), (-1,-1), pad_l),
-            ("RIGHTPADDING",  (0,0), (-1,-1), pad_r),
-        ]))
-        return t
-
-    # ── Canvas decorations (header + footer) ─────────────────
-    def add_page_decorations(c: canvas.Canvas, doc):
-        c.saveState()
-
-        # ── Subtle off-white page background ──
-        c.setFillColor(C_PAGE_BG)
-        c.rect(0, 0, W, H, fill=1, stroke=0)
-
-        # ── Top accent bar: indigo (left 65 %) + cyan (right 35 %) ──
-        c.setFillColor(C_INDIGO_MID)
-        c.rect(0, H - 6, W * 0.65, 6, fill=1, stroke=0)
-        c.setFillColor(C_CYAN)
-        c.rect(W * 0.65, H - 6, W * 0.35, 6, fill=1, stroke=0)
-
-        # ── Header background (very subtle) ──
-        c.setFillColor(HexColor("#FFFFFF"))
-        c.rect(0, H - 88, W, 82, fill=1, stroke=0)
-
-        # ── Logo badge (filled circle) ──
-        c.setFillColor(C_INDIGO_MID)
-        c.circle(62, H - 44, 20, fill=1, stroke=0)
-        c.setFillColor(C_WHITE)
-        c.setFont(_FONT_BOLD, 11)
-        c.drawCentredString(62, H - 49, "AI")
-
-        # ── Company name + tagline ──
-        c.setFillColor(C_INK)
-        c.setFont(_FONT_BOLD, 15)
-        c.drawString(92, H - 35, "AI VOICE ASSISTANT")
-
-        c.setFillColor(C_SOFT)
-        c.setFont(_FONT_REG, 8.5)
-        c.drawString(92, H - 52, "Intelligent Booking & Appointment System")
-
-        # ── INVOICE label (right-aligned) ──
-        c.setFillColor(C_SOFT)
-        c.setFont(_FONT_REG, 7.5)
-        c.drawRightString(W - 45, H - 30, "B O O K I N G   I N V O I C E")
-
-        # ── Invoice number ──
-        c.setFillColor(C_INDIGO_MID)
-        c.setFont(_FONT_BOLD, 11)
-        c.drawRightString(W - 45, H - 49, f"# {session_id}")
-
-        # ── Header bottom rule ──
-        c.setStrokeColor(C_BORDER)
-        c.setLineWidth(0.75)
-        c.line(45, H - 78, W - 45, H - 78)
-
-        # ── Thin indigo accent left-side rule (decorative) ──
-        c.setStrokeColor(C_INDIGO_MID)
-        c.setLineWidth(2.5)
-        c.line(45, H - 82, 45, H - 78)
-
-        # ── Footer background ──
-        c.setFillColor(HexColor("#F1F5F9"))
-        c.rect(0, 0, W, 50, fill=1, stroke=0)
-        c.setStrokeColor(C_BORDER)
-        c.setLineWidth(0.6)
-        c.line(0, 50, W, 50)
-
-        # ── Footer accent bar ──
-        c.setFillColor(C_INDIGO_MID)
-        c.rect(0, 48, W * 0.65, 2, fill=1, stroke=0)
-        c.setFillColor(C_CYAN)
-        c.rect(W * 0.65, 48, W * 0.35, 2, fill=1, stroke=0)
-
-        # ── Footer text ──
-        c.setFillColor(C_SOFT)
-        c.setFont(_FONT_BOLD, 8)
-        c.drawCentredString(W / 2, 32, "AI Voice Assistant  ·  Intelligent Booking & Appointment System")
-        c.setFont(_FONT_REG, 7.5)
-        c.setFillColor(HexColor("#94A3B8"))
-        c.drawCentredString(
-            W / 2, 16,
-            "Thank you for choosing our service. Bring this invoice to your appointment."
-        )
-
-        c.restoreState()
-
-    # ── Document ─────────────────────────────────────────────
-    doc = SimpleDocTemplate(
-        filename,
-        pagesize=A4,
-        topMargin=100,
-        bottomMargin=62,
-        leftMargin=45,
-        rightMargin=45,
-    )
-
-    CONTENT_W = W - 90  # 45 + 45 margins  → 505.28 pt
-    COL1 = CONTENT_W * 0.34  # label column  ~172 pt
-    COL2 = CONTENT_W * 0.66  # value column  ~333 pt
-
-    elements = []
-
-    # ── ① Meta info row (invoice details | status badge) ────
-    # Left: invoice metadata
-    meta_rows = [
-        [Paragraph("INVOICE #", s_label),  Paragraph(session_id,  s_value)],
-        [Paragraph("DATE",       s_label),  Paragraph(date_str,    s_value)],
-        [Paragraph("TIME",       s_label),  Paragraph(time_str,    s_value)],
-    ]
-    meta_left = Table(meta_rows, colWidths=[0.9 * inch, 2.5 * inch])
-    meta_left.setStyle(TableStyle([
-        ("BACKGROUND",    (0, 0), (-1, -1), C_META_BG),
-        ("TOPPADDING",    (0, 0), (-1, -1), 9),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 9),
-        ("LEFTPADDING",   (0, 0), (-1, -1), 14),
-        ("RIGHTPADDING",  (0, 0), (-1, -1), 14),
-        ("LINEBELOW",     (0, 0), (-1, -2), 0.5, HexColor("#C7D2FE")),
-        ("BOX",           (0, 0), (-1, -1), 0.8, HexColor("#C7D2FE")),
-        ("VALIGN",        (0, 0), (-1, -1), "MIDDLE"),
-    ]))
-
-    # Right: CONFIRMED badge
-    confirmed_rows = [
-        [Paragraph("BOOKING STATUS", s_conf_lbl)],
-        [Paragraph("CONFIRMED",       s_confirmed)],
-    ]
-    meta_right = Table(confirmed_rows, colWidths=[1.85 * inch])
-    meta_right.setStyle(TableStyle([
-        ("BACKGROUND",    (0, 0), (0, 0), C_GREEN_BADGE),
-        ("BACKGROUND",    (0, 1), (0, 1), C_GREEN_BG),
-        ("TOPPADDING",    (0, 0), (-1, -1), 10),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
-        ("ALIGN",         (0, 0), (-1, -1), "CENTER"),
-        ("BOX",           (0, 0), (-1, -1), 1.2, C_GREEN_BADGE),
-        ("LINEBELOW",     (0, 0), (0, 0),   1.5, C_GREEN_BADGE),
-    ]))
-
-    outer_meta = Table(
-        [[meta_left, "", meta_right]],
-        colWidths=[3.55 * inch, 0.25 * inch, 1.85 * inch],
-    )
-    outer_meta.setStyle(TableStyle([
-        ("VALIGN",      (0, 0), (-1, -1), "MIDDLE"),
-        ("LEFTPADDING", (0, 0), (-1, -1), 0),
-        ("RIGHTPADDING",(0, 0), (-1, -1), 0),
-        ("TOPPADDING",  (0, 0), (-1, -1), 0),
-        ("BOTTOMPADDING",(0, 0),(-1, -1), 0),
-    ]))
-
-    elements.append(outer_meta)
-    elements.append(Spacer(1, 0.32 * inch))
-
-    # ── ② Section header: BOOKING DETAILS ───────────────────
-    # Indigo left-bar accent + title on light-indigo background
-    section_data = [["", Paragraph("BOOKING DETAILS", ps("sh", bold=True, size=9,
-                                                           color=C_INDIGO_MID,
-                                                           space_before=0, space_after=0))]]
-    section_hdr = Table(section_data, colWidths=[5, CONTENT_W - 5])
-    section_hdr.setStyle(TableStyle([
-        ("BACKGROUND",    (0, 0), (0, 0), C_INDIGO_MID),
-        ("BACKGROUND",    (1, 0), (1, 0), C_META_BG),
-        ("TOPPADDING",    (0, 0), (-1, -1), 9),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 9),
-        ("LEFTPADDING",   (1, 0), (1, 0), 13),
-        ("LEFTPADDING",   (0, 0), (0, 0), 0),
-        ("RIGHTPADDING",  (0, 0), (-1, -1), 12),
-        ("VALIGN",        (0, 0), (-1, -1), "MIDDLE"),
-    ]))
-
-    elements.append(section_hdr)
-    elements.append(Spacer(1, 4))
-
-    # ── ③ Booking details table ──────────────────────────────
-    def _row(label: str, value: str, alt: bool):
-        row_bg = C_ROW_ALT if alt else C_WHITE
-        return [
-            Paragraph(label, s_td_key),
-            Paragraph(value or "—", s_td_val),
-        ], row_bg
-
-    rows_raw = [
-        ("Store",            session_data.get("store",    "—")),
-        ("Product / Service",session_data.get("product",  "—")),
-        ("Service Details",  session_data.get("details",  "—")),
-        ("Appointment Date", session_data.get("appointment_date", "To be confirmed")),
-        ("Appointment Time", session_data.get("appointment_time", "To be confirmed")),
-    ]
-
-    table_data = [
-        [Paragraph("Field",       s_th),
-         Paragraph("Information", s_th)],
-    ]
-    row_styles = [
-        ("BACKGROUND",    (0, 0), (-1, 0), C_INDIGO_DEEP),
-        ("TEXTCOLOR",     (0, 0), (-1, 0), C_WHITE),
-        ("TOPPADDING",    (0, 0), (-1, 0), 13),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 13),
-        ("LEFTPADDING",   (0, 0), (-1, 0), 15),
-        ("RIGHTPADDING",  (0, 0), (-1, 0), 15),
-        ("LINEBELOW",     (0, 0), (-1, 0), 2.5, C_INDIGO_MID),
-    ]
-
-    for i, (label, value) in enumerate(rows_raw):
-        row, bg = _row(label, value, alt=(i % 2 == 1))
-        table_data.append(row)
-        ri = i + 1
-        row_styles += [
-            ("BACKGROUND",    (0, ri), (0, ri),  C_ROW_LABEL),
-            ("BACKGROUND",    (1, ri), (1, ri),  bg),
-            ("TOPPADDING",    (0, ri), (-1, ri), 11),
-            ("BOTTOMPADDING", (0, ri), (-1, ri), 11),
-            ("LEFTPADDING",   (0, ri), (-1, ri), 15),
-            ("RIGHTPADDING",  (0, ri), (-1, ri), 15),
-        ]
-
-    row_styles += [
-        ("FONTNAME",  (0, 1), (-1, -1), _FONT_REG),
-        ("GRID",      (0, 0), (-1, -1), 0.5, C_BORDER),
-        ("BOX",       (0, 0), (-1, -1), 1.2, C_BORDER),
-        ("VALIGN",    (0, 0), (-1, -1), "MIDDLE"),
-    ]
-
-    booking_table = Table(table_data, colWidths=[COL1, COL2])
-    booking_table.setStyle(TableStyle(row_styles))
-    elements.append(booking_table)
-    elements.append(Spacer(1, 0.35 * inch))
-
-    # ── ④ Notes ──────────────────────────────────────────────
-    notes_table = Table(
-        [[Paragraph(
-            "<b>Important:</b>  Bring this invoice to your appointment. "
-            "For changes or cancellations please contact the store at least "
-            "24 hours in advance.",
-            ps("notes_p", size=8.5, color=C_SOFT, align=TA_CENTER, leading=13)
-        )]],
-        colWidths=[CONTENT_W],
-    )
-    notes_table.setStyle(TableStyle([
-        ("BACKGROUND",    (0, 0), (-1, -1), HexColor("#F1F5F9")),
-        ("BOX",           (0, 0), (-1, -1), 0.6, C_BORDER),
-        ("TOPPADDING",    (0, 0), (-1, -1), 10),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
-        ("LEFTPADDING",   (0, 0), (-1, -1), 18),
-        ("RIGHTPADDING",  (0, 0), (-1, -1), 18),
-    ]))
-    elements.append(notes_table)
-
-    # ── Build ─────────────────────────────────────────────────
-    doc.build(
-        elements,
-        onFirstPage=add_page_decorations,
-        onLaterPages=add_page_decorations,
-    )
-
-    print(f"[invoice] Created: {filename}")
-    return filename
-
-
 # --------------------------------------------------
 # Start Session
 # --------------------------------------------------
 @app.post("/session/start")
 def start_session(data: StartSessionRequest):
 
-    session_id = f"{data.store.replace(' ', '_')}-{len(sessions) + 1}"
+    session_id = sessions.new_id(data.store.replace(' ', '_'))
 
-    sessions[session_id] = {
+    sessions.save(session_id, {
         "store": data.store,
         "product": data.product,
         "details": data.details,
         "history": [],
         "invoice_generated": False,
+        "invoice_status": None,
         "invoice_url": None,
         "appointment_date": None,
         "appointment_time": None,
-    }
+    })
 
     return {
         "session_id": session_id,
@@ -475,30 +209,12 @@ def start_session(data: StartSessionRequest):
 # --------------------------------------------------
 # Handle Message
 # --------------------------------------------------
-@app.post("/session/message")
-def handle_message(data: MessageRequest):
-
-    session = sessions.get(data.session_id)
-
-    if not session:
-        return {"error": "Invalid session"}
-
-    session["history"].append(
-        {"role": "user", "content": data.message}
-    )
-
-    messages = [
-        {
-            "role": "system",
-            "content": f"""
+# The instructions are identical for every session and every day, so they
+# go first: providers cache prompt prefixes, and anything that varies
+# (date, store, product) placed above them would defeat that cache.
+BOOKING_INSTRUCTIONS = """
 You are a professional booking assistant helping customers schedule appointments.
-
-Today's Date: {datetime.datetime.now().strftime('%B %d, %Y')} ({datetime.datetime.now().strftime('%Y-%m-%d')})
-
-Booking Context:
-Store: {session['store']}
-Product: {session['product']}
-Details: {session['details']}
+The booking context and today's date follow in the next message.
 
 Your Task:
 1. Ask for the customer's preferred appointment date and time
@@ -509,12 +225,12 @@ Your Task:
 
 Respond ONLY in valid JSON format:
 
-{{
+{
   "reply": "your friendly response to the customer",
   "completed": true or false,
   "appointment_date": "YYYY-MM-DD or null",
   "appointment_time": "HH:MM or null"
-}}
+}
 
 Important Rules:
 - Accept future dates for appointments (appointments are meant to be in the future!)
@@ -529,35 +245,190 @@ Important Rules:
 Example Flow:
 Customer: "March 2nd at 6pm"
 Your reply: "Perfect! I've scheduled your appointment for March 2nd, 2026 at 6:00 PM. Is this correct?"
-JSON: {{"reply": "...", "completed": true, "appointment_date": "2026-03-02", "appointment_time": "18:00"}}
+JSON: {"reply": "...", "completed": true, "appointment_date": "2026-03-02", "appointment_time": "18:00"}
 """
-        }
-    ]
 
-    messages += session["history"]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-        )
+_INSTRUCTIONS_MESSAGE = {"role": "system", "content": BOOKING_INSTRUCTIONS}
 
-        raw_text = response.choices[0].message.content
-        print("Raw LLM Output:", raw_text)
 
-        parsed = json.loads(raw_text)
+def _booking_prefix(session: dict) -> list:
+    """Static instructions + this session's context, rendered once per session per day.
 
-    except Exception as e:
-        print("OpenAI / JSON Error:", e)
-        parsed = {
-            "reply": "Internal reasoning error. Please continue.",
-            "completed": False,
-            "appointment_date": None,
-            "appointment_time": None,
-        }
+    Only the context is kept on the session: the instructions are the same
+    for everyone and would otherwise be written to the store on every turn.
+    """
+
+    today = datetime.date.today()
+
+    if session.get("prompt_date") != today.isoformat() or "prompt_context" not in session:
+        session["prompt_date"] = today.isoformat()
+        session["prompt_context"] = f"""
+Today's Date: {today.strftime('%B %d, %Y')} ({today.isoformat()})
 
-    print("Parsed JSON:", parsed)
+Booking Context:
+Store: {session['store']}
+Product: {session['product']}
+Details: {session['details']}
+"""
+
+    return [_INSTRUCTIONS_MESSAGE, {"role": "system", "content": session["prompt_context"]}]
+
+
+def _booking_messages(session: dict) -> list:
+    """Cached prompt prefix + conversation history for one booking turn."""
+
+    return _booking_prefix(session) + history_manager.window(session)
+
+
+async def _summarize_history(previous_summary: str, messages: list) -> str:
+    """Fold older booking turns into the rolling summary."""
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+    response = await _complete(
+        "history",
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": """
+You maintain a running summary of a booking conversation.
+
+Merge the previous summary with the new messages into ONE short summary (max 80 words).
+Keep every fact that matters for the booking: requested or rejected dates and times,
+constraints the customer mentioned, and anything already confirmed.
+Return only the summary text.
+"""
+            },
+            {
+                "role": "user",
+                "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+            }
+        ],
+        temperature=0.2,
+    )
+
+    return response.choices[0].message.content.strip()
+
+
+history_manager = HistoryManager(_summarize_history)
+
+
+# Process-wide prompt-cache accounting (provider-reported)
+prompt_cache = {"prompt_tokens": 0, "cached_tokens": 0}
+
+
+def _record_usage(session_id: str, session: dict, messages: list, usage):
+    """Log prompt size and cache hits per turn.
+
+    Prompt size shows whether history growth is under control; the cached
+    share shows whether the static prompt prefix is being reused.
+    """
+
+    prompt_tokens = usage.prompt_tokens if usage else None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if usage else 0
+
+    # Running totals, not per-turn lists, so a long call doesn't grow the session
+    totals = session.setdefault("usage", {"turns": 0, "prompt_tokens": 0, "cached_tokens": 0})
+    totals["turns"] += 1
+    totals["prompt_tokens"] += prompt_tokens or 0
+    totals["cached_tokens"] += cached_tokens
+
+    if prompt_tokens:
+        prompt_cache["prompt_tokens"] += prompt_tokens
+        prompt_cache["cached_tokens"] += cached_tokens
+
+    total = prompt_cache["prompt_tokens"]
+    log.info(
+        "prompt_usage",
+        route="/session/message",
+        session_id=session_id,
+        turn=totals["turns"],
+        prompt_tokens=prompt_tokens,
+        estimated_tokens=message_tokens(messages),
+        cached_tokens=cached_tokens,
+        summarized=session.get("summarized_upto", 0),
+        history_len=len(session["history"]),
+        cache_ratio=round(prompt_cache["cached_tokens"] / total, 3) if total else 0,
+    )
+
+
+# --------------------------------------------------
+# Local fast path (date/time parsed without the LLM)
+# --------------------------------------------------
+BOOKING_FAST_PATH = os.getenv("BOOKING_FAST_PATH", "1") == "1"
+
+turn_paths = {
+    "fast": {"turns": 0, "seconds": 0.0},
+    "llm":  {"turns": 0, "seconds": 0.0},
+}
+
+
+def _fast_path_reply(message: str):
+    """Templated confirmation when the message is an unambiguous date + time."""
+
+    if not BOOKING_FAST_PATH:
+        return None
+
+    slot = extract_appointment(message)
+    if not slot["confident"]:
+        return None
+
+    return {
+        "reply": confirmation_reply(slot["date"], slot["time"]),
+        "completed": True,
+        "appointment_date": slot["date"].isoformat(),
+        "appointment_time": slot["time"].strftime("%H:%M"),
+    }
+
+
+def _record_path(path: str, started: float):
+    """Count the turn against its path and log hit rate and mean latency of both."""
+
+    elapsed = time.perf_counter() - started
+    stats = turn_paths[path]
+    stats["turns"] += 1
+    stats["seconds"] += elapsed
+
+    fast, llm = turn_paths["fast"], turn_paths["llm"]
+    total = fast["turns"] + llm["turns"]
+    log.info(
+        "turn_path",
+        route="/session/message",
+        path=path,
+        ms=round(elapsed * 1000, 1),
+        hit_rate=round(fast["turns"] / total, 3),
+        avg_fast_ms=round(fast["seconds"] / fast["turns"] * 1000, 1) if fast["turns"] else 0,
+        avg_llm_ms=round(llm["seconds"] / llm["turns"] * 1000, 1) if llm["turns"] else 0,
+    )
+
+
+def _fallback_reply() -> dict:
+    return {
+        "reply": "Internal reasoning error. Please continue.",
+        "completed": False,
+        "appointment_date": None,
+        "appointment_time": None,
+    }
+
+
+# What a turn changes on its copy of the session. Only these go back, so the
+# invoice status and history summary saved by background tasks meanwhile survive
+TURN_FIELDS = ("history", "appointment_date", "appointment_time",
+               "prompt_date", "prompt_context", "usage")
+
+
+async def _save_turn(session_id: str, session: dict, **fields):
+    # Off the loop: with SQLite, BEGIN IMMEDIATE can wait out another worker's write
+    changes = {k: session[k] for k in TURN_FIELDS if k in session}
+    if not await asyncio.to_thread(sessions.update, session_id, **changes, **fields):
+        await asyncio.to_thread(sessions.save, session_id, session)   # evicted mid-turn: nothing newer to lose
+
+
+async def _finish_turn(session_id: str, session: dict, parsed: dict) -> dict:
+    """Record the assistant reply, save the appointment and issue the invoice."""
 
     session["history"].append(
         {"role": "assistant", "content": parsed["reply"]}
@@ -570,20 +441,656 @@ JSON: {{"reply": "...", "completed": true, "appointment_date": "2026-03-02", "ap
     if parsed.get("appointment_time"):
         session["appointment_time"] = parsed["appointment_time"]
 
-    # Generate invoice ONCE
+    # Generate invoice ONCE — rendered in the background, poll /session/{id}/invoice
+    invoice_fields = {}
     if parsed.get("completed") and not session["invoice_generated"]:
 
-        invoice_path = generate_invoice(data.session_id, session)
-        session["invoice_url"] = f"http://localhost:8001/{invoice_path}"
         session["invoice_generated"] = True
+        session["invoice_status"] = "pending"
+        session["invoice_issued_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        # Claimed by this worker, so another one's requeue doesn't render it too
+        session["invoice_claimed_by"] = WORKER_ID
+        session["invoice_claimed_at"] = time.time()
+        invoice_fields = {k: session[k] for k in ("invoice_generated", "invoice_status", "invoice_issued_at",
+                                                  "invoice_claimed_by", "invoice_claimed_at")}
+
+    await _save_turn(session_id, session, **invoice_fields)
+    # After the save, so the render's "ready" can't be overwritten by this turn's "pending"
+    if invoice_fields:
+        invoice_queue.submit(_render_invoice(session_id, session))
+    history_manager.maybe_summarize(session_id, session, sessions)
 
     return {
         "assistant_message": parsed["reply"],
         "completed": parsed.get("completed", False),
         "invoice_url": session["invoice_url"],
+        "invoice_status": session["invoice_status"],
     }
 
 
+async def _render_invoice(session_id: str, session: dict):
+    # Only the invoice fields cross the process boundary, not the history
+    invoice_data = {
+        "store": session["store"],
+        "product": session["product"],
+        "details": session["details"],
+        "appointment_date": session["appointment_date"],
+        "appointment_time": session["appointment_time"],
+        "issued_at": session.get("invoice_issued_at"),
+    }
+
+    try:
+        with metrics.stage("invoice", "render"):
+            pdf = await invoice_queue.render(session_id, invoice_data)
+        key = f"{session_id}.pdf"
+        day = issue_day(invoice_data["issued_at"])   # the blob's shard, so a download checks one path
+        with metrics.stage("invoice", "store"):
+            await asyncio.to_thread(invoice_store.put, key, pdf, day)
+        log.info("invoice_stored", session_id=session_id, key=key, bytes=len(pdf))
+        invoice_url = f"{INVOICE_BASE_URL}/session/{session_id}/invoice.pdf"
+        if day is not None:
+            invoice_url += f"?issued={day.isoformat()}"
+        status = "ready"
+    except Exception as e:
+        log.error("invoice_render_failed", session_id=session_id, error=repr(e))
+        invoice_url = None
+        status = "failed"
+
+    # Only the invoice fields: the session may have moved on (or been evicted) while rendering
+    if not await asyncio.to_thread(sessions.update, session_id, invoice_url=invoice_url, invoice_status=status):
+        return
+
+    _push(session_id, {"type": "invoice", "status": status, "invoice_url": invoice_url})
+
+
+@app.post("/session/message")
+async def handle_message(data: MessageRequest):
+
+    session = await asyncio.to_thread(sessions.get, data.session_id)
+
+    if not session:
+        return {"error": "Invalid session"}
+
+    session["history"].append(
+        {"role": "user", "content": data.message}
+    )
+
+    started = time.perf_counter()
+    with metrics.stage("/session/message", "fast_path"):
+        parsed = _fast_path_reply(data.message)
+
+    if parsed is not None:
+        _record_path("fast", started)
+    else:
+        with metrics.stage("/session/message", "prompt"):
+            messages = _booking_messages(session)
+
+        try:
+            response = await _complete(
+                "/session/message",
+                model="gpt-4o-mini",
+                messages=messages,
+                response_format={"type": "json_object"},
+            )
+
+            raw_text = response.choices[0].message.content
+            log.debug("llm_output", route="/session/message", session_id=data.session_id, raw=raw_text)
+            _record_usage(data.session_id, session, messages, response.usage)
+
+            with metrics.stage("/session/message", "parse"):
+                parsed = json.loads(raw_text)
+
+        except Exception as e:
+            log.error("llm_turn_failed", route="/session/message", session_id=data.session_id, error=repr(e))
+            metrics.fallback_replies.labels("/session/message").inc()
+            parsed = _fallback_reply()
+
+        _record_path("llm", started)
+
+    log.debug("turn_parsed", route="/session/message", session_id=data.session_id, parsed=parsed)
+
+    with metrics.stage("/session/message", "finish"):
+        return await _finish_turn(data.session_id, session, parsed)
+
+
+# --------------------------------------------------
+# Handle Message  —  streamed (Server-Sent Events)
+# --------------------------------------------------
+async def _streamed_turn(session_id: str, session: dict, message: str, route: str):
+    """One booking turn with the reply streamed as it is generated.
+
+    The user message must already be in the session history. Yields
+    ("delta", {"text"}) for each new piece of the reply, then ("done", {...})
+    with the final turn state. Used by the SSE and WebSocket routes.
+    """
+
+    started = time.perf_counter()
+    with metrics.stage(route, "fast_path"):
+        fast = _fast_path_reply(message)
+
+    if fast is not None:
+        parsed = fast
+        _record_path("fast", started)
+        yield "delta", {"text": parsed["reply"]}
+    else:
+        with metrics.stage(route, "prompt"):
+            messages = _booking_messages(session)
+        extractor = ReplyExtractor()
+
+        try:
+            # The call stays in flight until the last chunk, not just until headers arrive
+            with metrics.llm_in_flight.track(), metrics.stage(route, "llm"):
+                stream = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+
+                async for chunk in stream:
+                    if chunk.usage:
+                        metrics.count_tokens(chunk.usage)
+                        _record_usage(session_id, session, messages, chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    text = extractor.feed(delta)
+                    if text:
+                        yield "delta", {"text": text}
+
+            log.debug("llm_output", route=route, session_id=session_id, raw=extractor.raw)
+            with metrics.stage(route, "parse"):
+                parsed = json.loads(extractor.raw)
+
+        except Exception as e:
+            log.error("llm_turn_failed", route=route, session_id=session_id, error=repr(e))
+            metrics.fallback_replies.labels(route).inc()
+            parsed = _fallback_reply()
+            # Only push the fallback text if nothing was spoken yet
+            if not extractor.reply:
+                yield "delta", {"text": parsed["reply"]}
+
+        _record_path("llm", started)
+
+    log.debug("turn_parsed", route=route, session_id=session_id, parsed=parsed)
+
+    with metrics.stage(route, "finish"):
+        result = await _finish_turn(session_id, session, parsed)
+    result["appointment_date"] = session["appointment_date"]
+    result["appointment_time"] = session["appointment_time"]
+
+    yield "done", result
+
+
+@app.post("/session/message/stream")
+async def handle_message_stream(data: MessageRequest):
+    """Same turn as /session/message, but the reply is pushed as it is generated.
+
+    Events:
+      delta  {"text": "..."}                       — next piece of the reply
+      done   {"assistant_message", "completed",
+              "appointment_date", "appointment_time",
+              "invoice_url", "invoice_status"}      — final turn state
+      error  {"error": "..."}                      — unknown session
+    """
+
+    session = await asyncio.to_thread(sessions.get, data.session_id)
+
+    if not session:
+        return StreamingResponse(
+            iter([sse_event("error", {"error": "Invalid session"})]),
+            media_type="text/event-stream",
+        )
+
+    session["history"].append(
+        {"role": "user", "content": data.message}
+    )
+
+    async def event_stream():
+        async for event, payload in _streamed_turn(data.session_id, session, data.message, "/session/message/stream"):
+            yield sse_event(event, payload)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --------------------------------------------------
+# Call WebSocket  —  one connection per call, server can push
+# --------------------------------------------------
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))   # events waiting on a slow client
+
+# session_id -> outgoing queues of that session's open sockets
+session_sockets: dict = {}
+
+
+class _SocketQueue(asyncio.Queue):
+    """Outgoing events of one socket, bounded so a client that stops reading
+    can't grow it without limit.
+
+    Past half full, reply deltas are dropped: the final `reply` still carries
+    the whole text. Any other event that doesn't fit means the client has
+    fallen too far behind, so what's queued is discarded and the sender
+    closes the socket.
+    """
+
+    def __init__(self, limit: int = WS_SEND_QUEUE_SIZE):
+        super().__init__()
+        self.limit = limit
+        self.dropped = 0
+        self.overflowed = False
+
+    def push(self, event: dict):
+        if self.overflowed:
+            return
+        size = self.qsize()
+        if event["type"] == "delta" and size >= self.limit // 2:
+            self.dropped += 1
+            return
+        if size >= self.limit:
+            self.overflowed = True
+            while not self.empty():
+                self.get_nowait()
+            self.put_nowait(None)   # tells the sender to close
+            return
+        self.put_nowait(event)
+
+
+def _push(session_id: str, event: dict):
+    for queue in session_sockets.get(session_id, ()):
+        queue.push(event)
+
+
+async def _socket_sender(websocket: WebSocket, queue: _SocketQueue):
+    # The only writer, so turn deltas and invoice events never interleave mid-frame
+    while True:
+        event = await queue.get()
+        if event is None:
+            await websocket.close(code=1008, reason="Client is not reading")
+            return
+        await websocket.send_json(event)
+
+
+async def _socket_turn(session_id: str, message: str, turn: int, queue: _SocketQueue):
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        queue.push({"type": "error", "turn": turn, "error": "Invalid session"})
+        return
+
+    session["history"].append(
+        {"role": "user", "content": message}
+    )
+
+    try:
+        async for event, payload in _streamed_turn(session_id, session, message, "/session/ws"):
+            queue.push({"type": "reply" if event == "done" else event, "turn": turn, **payload})
+    except asyncio.CancelledError:
+        # Barged in: keep what the customer said, drop the unfinished reply
+        await _save_turn(session_id, session)
+        raise
+    except Exception as e:
+        log.error("socket_turn_failed", route="/session/ws", session_id=session_id, error=repr(e))
+        queue.push({"type": "error", "turn": turn, "error": "Turn failed"})
+
+
+async def _transcribe(route: str, segment, sample_rate: int) -> str:
+    import speech   # NumPy loads with the first audio, not at startup
+    with metrics.stage(route, "stt"):
+        return (await speech.get_engine().transcribe(segment.pcm, sample_rate)).strip()
+
+
+async def _socket_audio_turn(session_id: str, segment, sample_rate: int, turn: int,
+                             queue: _SocketQueue, heard: dict, previous: asyncio.Task = None):
+    try:
+        text = await _transcribe("/session/ws", segment, sample_rate)
+    except Exception as e:
+        log.error("stt_failed", route="/session/ws", session_id=session_id, error=repr(e))
+        queue.push({"type": "error", "turn": turn, "error": "Speech recognition failed"})
+        return
+
+    if previous is not None:
+        # The rest of an utterance cut at VAD_MAX_UTTERANCE_MS: answer it after
+        # the first part, and a barge-in now cuts off both
+        try:
+            await asyncio.wait({previous})
+        except asyncio.CancelledError:
+            if not previous.done():
+                previous.cancel()
+                await asyncio.wait({previous})
+                if previous.cancelled():
+                    metrics.turns_cancelled.inc()
+                    queue.push({"type": "cancelled", "turn": turn - 1})
+            raise
+    heard["done"] = True
+
+    if not text:
+        return
+    queue.push({"type": "transcript", "turn": turn, "text": text,
+                "start_ms": segment.start_ms, "end_ms": segment.end_ms})
+    await _socket_turn(session_id, text, turn, queue)
+
+
+def _valid_sample_rate(sample_rate) -> bool:
+    return sample_rate is None or 8000 <= sample_rate <= 48000
+
+
+async def _refuse(websocket: WebSocket, code: int, error: str):
+    await websocket.send_json({"type": "error", "error": error})
+    await websocket.close(code=code, reason=error)
+
+
+@app.websocket("/session/{session_id}/ws")
+async def session_socket(websocket: WebSocket, session_id: str, sample_rate: int = None):
+    """Duplex version of /session/message for a whole call.
+
+    Client → server:
+      {"type": "utterance", "text": "..."}   — a user turn; cancels one still running
+      {"type": "barge_in"}                   — user started speaking; cancel the running turn
+      {"type": "ping"}
+      binary frames                          — microphone audio, 16-bit mono PCM at
+                                               ?sample_rate= (AUDIO_SAMPLE_RATE); see speech.py.
+                                               Detected speech barges in; each finished
+                                               utterance is transcribed and becomes a turn.
+    Server → client:
+      speech_start {"ms", "continued"}       — voice detected in the audio; `continued` when
+                                               a long utterance was split (no barge-in)
+      transcript   {"turn", "text", "start_ms", "end_ms"}
+      delta     {"turn", "text"}             — next piece of the reply
+      reply     {"turn", "assistant_message", "completed", "appointment_date",
+                 "appointment_time", "invoice_url", "invoice_status"}
+      cancelled {"turn"}                     — the turn was cut off by a barge-in
+      invoice   {"status": "ready" | "failed", "invoice_url"}
+      error     {"error"}, pong
+
+    An unknown session or bad sample_rate gets an error event, then close
+    code 4404 / 4400. A client too far behind on reading is closed with 1008.
+    """
+
+    # Accept before refusing: a close during the handshake reaches browsers
+    # as a bare 403/1006, without the code or the reason
+    await websocket.accept()
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        await _refuse(websocket, 4404, "Invalid session")
+        return
+    if not _valid_sample_rate(sample_rate):
+        await _refuse(websocket, 4400, "sample_rate must be 8000-48000")
+        return
+
+    queue = _SocketQueue()
+    session_sockets.setdefault(session_id, set()).add(queue)
+    sender = asyncio.create_task(_socket_sender(websocket, queue))
+    metrics.websocket_connections.inc()
+
+    # Reconnected after the invoice finished: push it now, it won't be pushed again
+    if session["invoice_status"] in ("ready", "failed"):
+        queue.push({"type": "invoice", "status": session["invoice_status"],
+                    "invoice_url": session["invoice_url"]})
+
+    running, turn = None, 0
+    vad, heard, carry = None, {}, b""
+
+    async def cancel_running():
+        nonlocal carry
+        if running is None or running.done():
+            return
+        running.cancel()
+        await asyncio.wait({running})
+        if running.cancelled():
+            metrics.turns_cancelled.inc()
+            queue.push({"type": "cancelled", "turn": turn})
+            if heard.get("pcm") and not heard.get("done"):
+                # Cut off before it was even transcribed: prepend it to the next utterance
+                carry = heard["pcm"]
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+
+            if frame.get("bytes") is not None:
+                if vad is None:
+                    import speech
+                    vad = speech.EnergyVAD(sample_rate or speech.AUDIO_SAMPLE_RATE)
+                with metrics.stage("/session/ws", "vad"):
+                    events = vad.feed(frame["bytes"])
+                for event in events:
+                    if event.kind == "speech_start":
+                        if not event.continued:   # a forced split isn't the caller talking over the reply
+                            await cancel_running()
+                        queue.push({"type": "speech_start", "ms": event.ms, "continued": event.continued})
+                        continue
+                    segment = event.segment
+                    if carry:
+                        segment = segment._replace(pcm=carry + segment.pcm)
+                        carry = b""
+                    previous = running if event.continued and running is not None and not running.done() else None
+                    turn += 1
+                    heard = {"pcm": segment.pcm}
+                    running = asyncio.create_task(
+                        _socket_audio_turn(session_id, segment, vad.sample_rate, turn, queue, heard, previous)
+                    )
+                continue
+
+            try:
+                message = json.loads(frame.get("text") or "")
+                kind = message.get("type")
+            except (ValueError, AttributeError):
+                queue.push({"type": "error", "error": "Expected a JSON object"})
+                continue
+
+            if kind in ("utterance", "barge_in"):
+                await cancel_running()
+
+            if kind == "utterance":
+                text = str(message.get("text") or "").strip()
+                if not text:
+                    queue.push({"type": "error", "error": "Empty utterance"})
+                    continue
+                turn += 1
+                running = asyncio.create_task(_socket_turn(session_id, text, turn, queue))
+            elif kind == "ping":
+                queue.push({"type": "pong"})
+            elif kind != "barge_in":
+                queue.push({"type": "error", "error": f"Unknown message type: {kind}"})
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        metrics.websocket_connections.dec()
+        if queue.overflowed or queue.dropped:
+            log.warning("socket_backlog", route="/session/ws", session_id=session_id,
+                        closed=queue.overflowed, dropped_deltas=queue.dropped)
+        if running is not None:
+            running.cancel()
+        sender.cancel()
+        sockets = session_sockets.get(session_id)
+        if sockets is not None:
+            sockets.discard(queue)
+            if not sockets:
+                del session_sockets[session_id]
+
+
+class _DuplexResponse(StreamingResponse):
+    # The body generator reads the request while the response streams, so it
+    # owns `receive`: StreamingResponse's own disconnect listener would
+    # swallow the request chunks (request.stream() sees the disconnect anyway)
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/session/{session_id}/audio")
+async def upload_audio(session_id: str, request: Request, sample_rate: int = None):
+    """Chunked upload of 16-bit mono PCM; NDJSON back as utterances are found.
+
+    For clients without WebSockets: stream the microphone as the request
+    body (Transfer-Encoding: chunked). Lines:
+      {"type": "speech_start", "ms", "continued"}
+      {"type": "transcript", "text", "start_ms", "end_ms", "detected_ms"}
+    Transcripts are not turns — send them on with /session/message.
+    """
+
+    if await asyncio.to_thread(sessions.get, session_id) is None:
+        return {"error": "Invalid session"}
+    if not _valid_sample_rate(sample_rate):
+        raise HTTPException(status_code=400, detail="sample_rate must be 8000-48000")
+
+    import speech
+    vad = speech.EnergyVAD(sample_rate or speech.AUDIO_SAMPLE_RATE)
+
+    async def line(event) -> str:
+        if event.kind == "speech_start":
+            return json.dumps({"type": "speech_start", "ms": event.ms, "continued": event.continued}) + "\n"
+        segment = event.segment
+        try:
+            text = await _transcribe("/session/audio", segment, vad.sample_rate)
+        except Exception as e:
+            log.error("stt_failed", route="/session/audio", session_id=session_id, error=repr(e))
+            return json.dumps({"type": "error", "error": "Speech recognition failed"}) + "\n"
+        return json.dumps({"type": "transcript", "text": text, "start_ms": segment.start_ms,
+                           "end_ms": segment.end_ms, "detected_ms": event.ms}) + "\n"
+
+    async def ndjson():
+        try:
+            async for chunk in request.stream():
+                with metrics.stage("/session/audio", "vad"):
+                    events = vad.feed(chunk)
+                for event in events:
+                    yield await line(event)
+        except ClientDisconnect:
+            return
+        last = vad.flush()
+        if last is not None:
+            yield await line(last)
+
+    return _DuplexResponse(ndjson(), media_type="application/x-ndjson")
+
+
+# --------------------------------------------------
+# Invoice Status
+# --------------------------------------------------
+@app.get("/session/{session_id}/invoice")
+def invoice_status(session_id: str):
+    """Poll the background invoice render for a completed booking."""
+
+    session = sessions.get(session_id)
+
+    if not session:
+        return {"error": "Invalid session"}
+
+    return {
+        "session_id": session_id,
+        "status": session["invoice_status"] or "not_requested",
+        "invoice_url": session["invoice_url"],
+        "queue": invoice_queue.stats(),
+    }
+
+
+def _byte_range(header: str, size: int):
+    """(start, end) — end exclusive — for a single-range "bytes=" header.
+
+    Returns None when the header should be ignored (not bytes, or several
+    ranges: we answer with the whole file), and raises ValueError when the
+    range cannot be satisfied.
+    """
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        # suffix range: the last N bytes
+        if not last.isdigit() or int(last) == 0:
+            raise ValueError(header)
+        return max(0, size - int(last)), size
+
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if start >= size or start >= end:
+        raise ValueError(header)
+    return start, end
+
+
+@app.get("/session/{session_id}/invoice.pdf")
+def invoice_pdf(session_id: str, request: Request, issued: datetime.date = None):
+    """Stream a rendered invoice from the blob store (ETag + Range aware).
+
+    `issued` (in the invoice URL) names the blob's day shard; without it the
+    session's issue date is used, if the session is still around.
+    """
+
+    key = f"{session_id}.pdf"
+    day = issued
+    if day is None:
+        session = sessions.get(session_id)
+        day = issue_day(session.get("invoice_issued_at")) if session else None
+    info = invoice_store.stat(key, day)
+    if info is None:
+        return Response(status_code=404)
+
+    headers = {
+        "ETag": info.etag,
+        "Last-Modified": formatdate(info.modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Content-Disposition": f'inline; filename="{key}"',
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and {info.etag, "*"} & {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, info.size, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == info.etag):
+        try:
+            byte_range = _byte_range(range_header, info.size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{info.size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{info.size}"
+
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        invoice_store.read(key, start, end, day=day),
+        status_code=status,
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+
+@app.get("/invoices/export.zip", dependencies=[Depends(require_admin)])
+def export_invoices(start: datetime.date, end: datetime.date):
+    """Stream a ZIP of every invoice issued between `start` and `end` (UTC days, inclusive)."""
+
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    return StreamingResponse(
+        stream_zip(invoice_store, start, end),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="invoices-{start}-to-{end}.zip"'},
+    )
+
+
+@app.get("/invoices/storage", dependencies=[Depends(require_admin)])
+def invoice_storage():
+    return {**invoice_store.stats(), "retention": invoice_retention.stats()}
+
+
 class FeedbackRequest(BaseModel):
     message: str
 
@@ -592,17 +1099,11 @@ class RewriteRequest(BaseModel):
     text: str
 
 
-@app.post("/feedback")
-def analyze_feedback(data: FeedbackRequest):
-    """Analyze customer feedback for sentiment, rating, and summary"""
+class FeedbackBatchRequest(BaseModel):
+    items: List[FeedbackRequest]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
+
+FEEDBACK_PROMPT = """
 You are a professional feedback analyzer.
 
 Analyze the customer feedback and respond ONLY in JSON format:
@@ -625,47 +1126,8 @@ Rules:
 - key_points should be 2-4 main points from feedback
 - Always return valid JSON
 """
-                },
-                {
-                    "role": "user",
-                    "content": f"Analyze this feedback: {data.message}"
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3,
-        )
-
-        result = json.loads(response.choices[0].message.content)
-
-        return {
-            "sentiment": result.get("sentiment", "neutral"),
-            "rating": result.get("rating", 3),
-            "summary": result.get("summary", "Thank you for your feedback!"),
-            "key_points": result.get("key_points", []),
-            "emotion": result.get("emotion", "neutral")
-        }
-
-    except Exception as e:
-        print("Feedback analysis error:", e)
-        return {
-            "sentiment": "neutral",
-            "rating": 3,
-            "summary": "Thank you for your feedback!",
-            "key_points": ["Feedback received"],
-            "emotion": "neutral"
-        }
-
-
-@app.post("/feedback/rewrite")
-def rewrite_feedback(data: RewriteRequest):
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
+REWRITE_PROMPT = """
 You are a professional writing assistant.
 
 Rewrite the user's feedback to:
@@ -678,23 +1140,281 @@ Rewrite the user's feedback to:
 Return only the improved version.
 Do not add extra commentary.
 """
-                },
-                {
-                    "role": "user",
-                    "content": data.text
-                }
-            ],
-            temperature=0.5,
+
+# --------------------------------------------------
+# Feedback response cache
+# --------------------------------------------------
+# Bump a version whenever its prompt or model changes so stale answers are not reused
+FEEDBACK_CACHE_VERSION = "gpt-4o-mini/feedback-v1"
+REWRITE_CACHE_VERSION  = "gpt-4o-mini/rewrite-v1"
+
+feedback_cache = ResponseCache()
+
+
+def _feedback_fallback() -> dict:
+    return {
+        "sentiment": "neutral",
+        "rating": 3,
+        "summary": "Thank you for your feedback!",
+        "key_points": ["Feedback received"],
+        "emotion": "neutral"
+    }
+
+
+async def _analyze_feedback_llm(message: str) -> dict:
+    response = await _complete(
+        "/feedback",
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": FEEDBACK_PROMPT
+            },
+            {
+                "role": "user",
+                "content": f"Analyze this feedback: {message}"
+            }
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.3,
+    )
+
+    with metrics.stage("/feedback", "parse"):
+        result = json.loads(response.choices[0].message.content)
+
+    return _feedback_result(result)
+
+
+def _feedback_result(result: dict) -> dict:
+    return {
+        "sentiment": result.get("sentiment", "neutral"),
+        "rating": result.get("rating", 3),
+        "summary": result.get("summary", "Thank you for your feedback!"),
+        "key_points": result.get("key_points", []),
+        "emotion": result.get("emotion", "neutral")
+    }
+
+
+async def _rewrite_feedback_llm(text: str) -> dict:
+    response = await _complete(
+        "/feedback/rewrite",
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": REWRITE_PROMPT
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ],
+        temperature=0.5,
+    )
+
+    improved = response.choices[0].message.content.strip()
+
+    return {
+        "improved_text": improved
+    }
+
+
+@app.post("/feedback")
+async def analyze_feedback(data: FeedbackRequest):
+    """Analyze customer feedback for sentiment, rating, and summary"""
+
+    key = cache_key("feedback", FEEDBACK_CACHE_VERSION, data.message)
+
+    try:
+        return await feedback_cache.get_or_compute(
+            key, lambda: _analyze_feedback_llm(data.message)
         )
 
-        improved = response.choices[0].message.content.strip()
+    except Exception as e:
+        log.error("feedback_failed", route="/feedback", error=repr(e))
+        metrics.fallback_replies.labels("/feedback").inc()
+        return _feedback_fallback()
 
-        return {
-            "improved_text": improved
-        }
+
+@app.post("/feedback/rewrite")
+async def rewrite_feedback(data: RewriteRequest):
+
+    key = cache_key("rewrite", REWRITE_CACHE_VERSION, data.text)
+
+    try:
+        return await feedback_cache.get_or_compute(
+            key, lambda: _rewrite_feedback_llm(data.text)
+        )
 
     except Exception as e:
-        print("Rewrite error:", e)
+        log.error("rewrite_failed", route="/feedback/rewrite", error=repr(e))
+        metrics.fallback_replies.labels("/feedback/rewrite").inc()
         return {
             "improved_text": data.text
-        }
\ No newline at end of file
+        }
+
+
+# --------------------------------------------------
+# Batch Feedback Analysis  —  NDJSON stream, input order
+# --------------------------------------------------
+FEEDBACK_BATCH_SIZE        = int(os.getenv("FEEDBACK_BATCH_SIZE", "20"))      # items per LLM call
+FEEDBACK_BATCH_CONCURRENCY = int(os.getenv("FEEDBACK_BATCH_CONCURRENCY", "4"))  # LLM calls in flight
+FEEDBACK_BATCH_MAX_ITEMS   = int(os.getenv("FEEDBACK_BATCH_MAX_ITEMS", "500"))  # per request
+
+FEEDBACK_BATCH_PROMPT = FEEDBACK_PROMPT + """
+You will receive a JSON array of feedback items, each with an "index".
+Analyze every item independently and respond ONLY with:
+
+{
+  "results": [
+    {"index": 0, "sentiment": ..., "rating": ..., "summary": ..., "key_points": [...], "emotion": ...}
+  ]
+}
+
+Return exactly one result per input item, with the same index.
+"""
+
+
+async def _analyze_feedback_chunk(messages: list, keys: list, slots: asyncio.Semaphore) -> list:
+    """Analyze one chunk of feedback with a single LLM call (cache hits skip it)."""
+
+    results = [feedback_cache.lookup(k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+
+    if missing:
+        items = [{"index": i, "feedback": messages[i]} for i in missing]
+
+        try:
+            async with slots:
+                response = await _complete(
+                    "/feedback/batch",
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": FEEDBACK_BATCH_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": json.dumps(items)
+                        }
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.3,
+                )
+
+            parsed = json.loads(response.choices[0].message.content).get("results", [])
+            by_index = {}
+            for r in parsed:
+                try:
+                    by_index[int(r["index"])] = r     # models sometimes send "0"
+                except (TypeError, KeyError, ValueError):
+                    continue
+
+        except Exception as e:
+            log.error("feedback_batch_failed", route="/feedback/batch", items=len(missing), error=repr(e))
+            metrics.fallback_replies.labels("/feedback/batch").inc()
+            by_index = {}
+
+        for i in missing:
+            if i in by_index:
+                results[i] = _feedback_result(by_index[i])
+                feedback_cache.put(keys[i], results[i])
+            else:
+                results[i] = _feedback_fallback()
+
+    return results
+
+
+@app.post("/feedback/batch")
+async def analyze_feedback_batch(data: FeedbackBatchRequest):
+    """Analyze many feedback items; one NDJSON line per item, in input order."""
+
+    if len(data.items) > FEEDBACK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {FEEDBACK_BATCH_MAX_ITEMS} items per batch")
+
+    # Items with the same cache key are analyzed once and answered from that one result
+    unique, keys, position = [], [], {}
+    slot_of = []
+    for item in data.items:
+        key = cache_key("feedback", FEEDBACK_CACHE_VERSION, item.message)
+        if key not in position:
+            position[key] = len(unique)
+            unique.append(item.message)
+            keys.append(key)
+        slot_of.append(position[key])
+
+    slots = asyncio.Semaphore(FEEDBACK_BATCH_CONCURRENCY)
+    chunks = [
+        asyncio.create_task(_analyze_feedback_chunk(
+            unique[start:start + FEEDBACK_BATCH_SIZE], keys[start:start + FEEDBACK_BATCH_SIZE], slots
+        ))
+        for start in range(0, len(unique), FEEDBACK_BATCH_SIZE)
+    ]
+
+    async def ndjson():
+        try:
+            for index, slot in enumerate(slot_of):
+                results = await chunks[slot // FEEDBACK_BATCH_SIZE]
+                yield json.dumps({"index": index, **results[slot % FEEDBACK_BATCH_SIZE]}) + "\n"
+        finally:
+            # Client went away — don't keep spending on the rest of the batch
+            for task in chunks:
+                task.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.get("/feedback/cache", dependencies=[Depends(require_admin)])
+def feedback_cache_stats():
+    """Hit/miss counters for the feedback response cache."""
+    return feedback_cache.stats()
+
+
+# --------------------------------------------------
+# Metrics  —  Prometheus text format, see metrics.py
+# --------------------------------------------------
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# --------------------------------------------------
+# Profiling  —  opt-in sampling profiler, see profiler.py
+# --------------------------------------------------
+# Also started per request by `X-Profile: N` (with X-Admin-Key): profiles
+# that request and the next N-1.
+@app.post("/debug/profile", dependencies=[Depends(require_admin)])
+def start_profile(requests: int = None, seconds: float = None):
+    """Sample for the next `requests` requests and/or `seconds` (capped by PROFILE_MAX_SECONDS)."""
+
+    if requests is not None and requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    return profiler.start(requests=requests, seconds=seconds)
+
+
+@app.delete("/debug/profile", dependencies=[Depends(require_admin)])
+def stop_profile():
+    return profiler.stop()
+
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+def profile_status():
+    return profiler.stats()
+
+
+@app.get("/debug/profile/stacks", dependencies=[Depends(require_admin)])
+def profile_stacks(target: str = "all"):
+    """Collapsed stacks ("frame;frame;frame count" per line) for flamegraph.pl or speedscope.
+
+    target=all has every sampled thread; handle_message, render_invoice, ...
+    (PROFILE_TARGETS) aggregate just the stacks through that function.
+    """
+
+    if target not in profiler.stats()["profiles"]:
+        raise HTTPException(status_code=404, detail="No samples for that target")
+    return Response(
+        profiler.collapsed(target),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{target}.folded"'},
+    )
@@ -0,0 +1,292 @@
+import bisect
+import time
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+# Upper bounds in seconds: sub-ms local stages up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(value) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# --------------------------------------------------
+# Instruments
+# --------------------------------------------------
+# Updates are plain attribute/list arithmetic with no locks: routes run on
+# the event loop, and a lost increment from a worker thread is acceptable
+# for monitoring. Label children are cached, so `.labels(...)` after the
+# first call is one dict lookup.
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._children = {}
+        REGISTRY.append(self)
+        if not self.labelnames:
+            self._default = self._child(())
+
+    def _child(self, values: tuple):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new()
+        return child
+
+    def labels(self, *values):
+        return self._child(values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(_label_str(self.labelnames, values), values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def track(self):
+        return _InProgress(self)
+
+
+class _InProgress:
+    __slots__ = ("_gauge",)
+
+    def __init__(self, gauge: _Value):
+        self._gauge = gauge
+
+    def __enter__(self):
+        self._gauge.value += 1
+
+    def __exit__(self, *exc):
+        self._gauge.value -= 1
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+    def _render_child(self, labels, values, child):
+        return [f"{self.name}{labels} {_num(child.value)}"]
+
+
+class Gauge(_Family):
+    """A value that goes up and down, or is read from `fn` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _new(self):
+        return _Value()
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def inc(self, amount: float = 1.0):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._default.value -= amount
+
+    def track(self):
+        """`with gauge.track():` counts the block while it runs."""
+        return _InProgress(self._default)
+
+    def render(self) -> list:
+        if self.fn is not None:
+            self._default.value = self.fn()
+        return super().render()
+
+    def _render_child(self, labels, values, child):
+        return [f"{self.name}{labels} {_num(child.value)}"]
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("_buckets", "_start")
+
+    def __init__(self, buckets: _Buckets):
+        self._buckets = buckets
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._buckets.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        """`with histogram.time():` observes the block's wall time in seconds."""
+        return _Timer(self._default)
+
+    def _render_child(self, labels, values, child):
+        lines, cumulative = [], 0
+        bounds = [_num(b) for b in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, child.counts):
+            cumulative += count
+            le = _label_str(self.labelnames + ("le",), values + (bound,))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {_num(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------------------------------
+# Application metrics
+# --------------------------------------------------
+request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response body, by handler.",
+    ("method", "handler", "status"),
+)
+stage_seconds = Histogram(
+    "stage_duration_seconds",
+    "Time spent in one stage of a route (prompt build, LLM call, bcrypt, ...).",
+    ("route", "stage"),
+)
+llm_in_flight = Gauge("llm_requests_in_flight", "LLM calls currently awaiting a response.")
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the LLM provider.", ("kind",))
+fallback_replies = Counter(
+    "fallback_replies_total",
+    "Replies served from a canned fallback because the LLM call or its JSON failed.",
+    ("route",),
+)
+sessions_active = Gauge("sessions_active", "Sessions held by the session store.")
+pending_registrations = Gauge("pending_registrations", "Registrations waiting for OTP verification.")
+websocket_connections = Gauge("websocket_connections", "Open /session/{id}/ws connections.")
+turns_cancelled = Counter("turns_cancelled_total", "Turns cancelled by a barge-in before they finished.")
+
+
+def stage(route: str, name: str) -> _Timer:
+    """`with metrics.stage("/auth/login", "bcrypt"):` times one stage of a route."""
+    return _Timer(stage_seconds.labels(route, name))
+
+
+def count_tokens(usage):
+    """Add an LLM response's token usage to `llm_tokens`."""
+    if not usage:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    llm_tokens.labels("prompt").inc(usage.prompt_tokens or 0)
+    llm_tokens.labels("completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+    llm_tokens.labels("cached").inc(getattr(details, "cached_tokens", 0) or 0)
+
+
+# --------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------
+class MetricsMiddleware:
+    """Observes every HTTP request into `request_seconds`.
+
+    Plain ASGI (no BaseHTTPMiddleware), so streaming responses pass through
+    untouched and are timed until their last chunk is sent. The handler
+    label is the endpoint function's name, which the router leaves in the
+    scope, so unknown paths can't blow up the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = scope.get("endpoint")
+            handler = getattr(endpoint, "__name__", "unmatched")
+            request_seconds.labels(scope["method"], handler, status).observe(time.perf_counter() - start)
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+BCRYPT_ROUNDS    = int(os.getenv("BCRYPT_ROUNDS", "12"))       # cost factor, 2^rounds iterations
+BCRYPT_WORKERS   = int(os.getenv("BCRYPT_WORKERS", "2"))       # hashes running at once
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))    # waiting beyond this → rejected
+
+
+class HasherBusy(Exception):
+    """Raised when the bcrypt queue is full; the route answers 503."""
+
+
+def hash_rounds(hashed: str) -> int:
+    """Cost factor stored in a bcrypt hash ("$2b$12$..." -> 12)."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+# --------------------------------------------------
+# Password hasher
+# --------------------------------------------------
+class PasswordHasher:
+    """Runs bcrypt on its own small thread pool, off the request threadpool.
+
+    bcrypt releases the GIL, so `workers` threads give that many hashes in
+    parallel. Jobs wait here (not in the pool), at most `max_queue` of them;
+    a burst beyond that fails fast with HasherBusy instead of piling up
+    behind the booking endpoints.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = BCRYPT_WORKERS,
+                 max_queue: int = BCRYPT_MAX_QUEUE):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(self.workers)
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._wait_total = 0.0
+        self._work_total = 0.0
+
+    async def _run(self, fn, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HasherBusy()
+
+        enqueued = time.perf_counter()
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            self.running += 1
+            started = time.perf_counter()
+            self._wait_total += started - enqueued
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, fn, *args)
+            finally:
+                self.running -= 1
+                self.completed += 1
+                self._work_total += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_ms": self._wait_total / done * 1000,
+            "avg_hash_ms": self._work_total / done * 1000,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
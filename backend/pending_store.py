@@ -0,0 +1,156 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+PENDING_MAX_ENTRIES    = int(os.getenv("PENDING_MAX_ENTRIES", "10000"))
+PENDING_TTL            = float(os.getenv("PENDING_TTL", "600"))             # seconds an OTP stays valid
+PENDING_SWEEP_INTERVAL = float(os.getenv("PENDING_SWEEP_INTERVAL", "30"))   # background sweep period
+
+
+def _entry_size(entry: dict) -> int:
+    """Rough footprint of one registration: dict overhead plus its strings."""
+    return 400 + sum(len(k) + len(v) + 100 for k, v in entry.items() if isinstance(v, str))
+
+
+# --------------------------------------------------
+# Pending registrations
+# --------------------------------------------------
+class PendingRegistrations:
+    """Sign-ups waiting for their OTP, keyed by normalized email.
+
+    A new `put()` for an email replaces the previous one. Expiry is tracked
+    in a heap ordered by deadline, so a sweep only touches entries that have
+    actually expired (plus stale heap records left by replacements). At
+    `max_entries` the registration closest to expiring makes room for the
+    new one, so a /send-otp flood can't grow memory without bound.
+    """
+
+    def __init__(self, max_entries: int = PENDING_MAX_ENTRIES, ttl: float = PENDING_TTL,
+                 sweep_interval: float = PENDING_SWEEP_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+
+        self._entries: dict = {}          # email -> (entry, deadline, seq, size)
+        self._heap: list = []             # (deadline, seq, email)
+        self._seq = itertools.count()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._task = None
+
+        self.replaced = 0
+        self.expired = 0
+        self.evicted = 0
+        self.sweeps = 0
+        self.sweep_seconds = 0.0
+        self.last_sweep_ms = 0.0
+
+    def put(self, email: str, entry: dict) -> dict:
+        """Store a registration that expires `ttl` seconds from now; sets entry["expires_at"]."""
+
+        deadline = time.time() + self.ttl
+        entry["expires_at"] = (datetime.utcnow() + timedelta(seconds=self.ttl)).isoformat()
+        size = _entry_size(entry)
+        seq = next(self._seq)
+
+        with self._lock:
+            if self._drop(email):
+                self.replaced += 1
+            self._sweep(time.time())
+            while len(self._entries) >= self.max_entries and self._heap:
+                _, old_seq, old_email = heapq.heappop(self._heap)
+                current = self._entries.get(old_email)
+                if current is not None and current[2] == old_seq:
+                    self._drop(old_email)
+                    self.evicted += 1
+
+            self._entries[email] = (entry, deadline, seq, size)
+            self._bytes += size
+            heapq.heappush(self._heap, (deadline, seq, email))
+        return entry
+
+    def get(self, email: str) -> Optional[dict]:
+        with self._lock:
+            current = self._entries.get(email)
+        return current[0] if current is not None else None
+
+    def pop(self, email: str):
+        with self._lock:
+            self._drop(email)
+
+    def _drop(self, email: str) -> bool:
+        # The heap record stays behind; sweeps skip it because its seq no longer matches
+        current = self._entries.pop(email, None)
+        if current is None:
+            return False
+        self._bytes -= current[3]
+        return True
+
+    def sweep(self) -> int:
+        """Remove every expired registration; returns how many were removed."""
+        with self._lock:
+            return self._sweep(time.time())
+
+    def _sweep(self, now: float) -> int:
+        start = time.perf_counter()
+        removed = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, email = heapq.heappop(heap)
+            current = self._entries.get(email)
+            if current is not None and current[2] == seq:
+                self._drop(email)
+                removed += 1
+
+        # Replacements leave stale records; rebuild once they outnumber live ones
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._heap = [(d, s, e) for e, (_, d, s, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+        elapsed = time.perf_counter() - start
+        self.expired += removed
+        self.sweeps += 1
+        self.sweep_seconds += elapsed
+        self.last_sweep_ms = elapsed * 1000
+        return removed
+
+    # ---- background sweeper ----
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "heap_size": len(self._heap),
+            "replaced": self.replaced,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "sweeps": self.sweeps,
+            "sweep_ms_total": self.sweep_seconds * 1000,
+            "last_sweep_ms": self.last_sweep_ms,
+        }
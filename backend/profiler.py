@@ -0,0 +1,292 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+PROFILE_INTERVAL_MS  = float(os.getenv("PROFILE_INTERVAL_MS", "5"))     # between samples
+PROFILE_MAX_SECONDS  = float(os.getenv("PROFILE_MAX_SECONDS", "300"))   # hard cap per profile
+PROFILE_MAX_STACKS   = int(os.getenv("PROFILE_MAX_STACKS", "20000"))    # distinct stacks kept
+PROFILE_MAX_DEPTH    = 128
+# Stacks through one of these functions are also aggregated under its name,
+# rooted at that frame, so every request's time adds up in one flame graph
+PROFILE_TARGETS      = tuple(filter(None, os.getenv(
+    "PROFILE_TARGETS", "handle_message,_streamed_turn,render_invoice"
+).split(",")))
+
+# A thread whose innermost Python frame is one of these is blocked, not working
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(code) -> str:
+    # co_qualname is 3.11+; on 3.10 a method shows up by its bare name
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collect_stacks(frame, max_depth: int = PROFILE_MAX_DEPTH):
+    """(labels root-first, function names root-first) for one thread's frame."""
+
+    codes = []
+    while frame is not None and len(codes) < max_depth:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return [_frame_label(c) for c in codes], [c.co_name for c in codes]
+
+
+# --------------------------------------------------
+# Sampler
+# --------------------------------------------------
+class StackSampler:
+    """Walks every thread's Python stack each `interval` seconds on its own thread.
+
+    Samples are folded into "frame;frame;frame" -> count, the collapsed
+    format flamegraph.pl, speedscope and inferno read directly. Blocked
+    threads (event loop in select, idle pool workers) are counted, not kept.
+    """
+
+    def __init__(self, interval: float, targets: tuple = PROFILE_TARGETS,
+                 max_stacks: int = PROFILE_MAX_STACKS, threads: set = None, root: str = None):
+        self.interval = interval
+        self.targets = targets
+        self.max_stacks = max_stacks
+        self.threads = threads        # only these thread ids; None = every thread
+        self.root = root              # root frame of "all" stacks; default "thread <name>"
+        self.stacks = {"all": Counter(), **{t: Counter() for t in targets}}
+        self.samples = 0
+        self.idle = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop sampling; with `wait=False` only signal the thread, which exits within one interval."""
+        self._stop.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own or (self.threads is not None and ident not in self.threads):
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    self.idle += 1
+                    continue
+                labels, funcs = collect_stacks(frame)
+                if self.root is None and ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self._add(self.root or f"thread {names.get(ident, ident)}", labels, funcs)
+            del frames
+
+    def _add(self, root: str, labels: list, funcs: list):
+        with self._lock:
+            self.samples += 1
+            self._count(self.stacks["all"], ";".join([root, *labels]))
+            for target in self.targets:
+                if target in funcs:
+                    self._count(self.stacks[target], ";".join(labels[funcs.index(target):]))
+
+    def _count(self, counter: Counter, stack: str):
+        if stack in counter or len(counter) < self.max_stacks:
+            counter[stack] += 1
+        else:
+            self.dropped += 1
+
+    def merge(self, stacks: dict):
+        """Fold in stacks sampled elsewhere (an invoice worker process)."""
+
+        with self._lock:
+            for name, counts in stacks.items():
+                counter = self.stacks.setdefault(name, Counter())
+                for stack, n in counts.items():
+                    if stack in counter or len(counter) < self.max_stacks:
+                        counter[stack] += n
+                    else:
+                        self.dropped += n
+
+    def collapsed(self, name: str) -> str:
+        with self._lock:
+            counts = dict(self.stacks.get(name, {}))
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {name: sum(c.values()) for name, c in self.stacks.items()}
+
+
+def sample_call(fn, *args, interval: float = PROFILE_INTERVAL_MS / 1000):
+    """Run `fn(*args)` on this thread while sampling it; returns (result, stacks).
+
+    Used inside invoice workers, where the API process's sampler can't see.
+    """
+
+    sampler = StackSampler(interval, threads={threading.get_ident()}, root=f"process {os.getpid()}")
+    sampler.start()
+    try:
+        result = fn(*args)
+    finally:
+        sampler.stop()
+    return result, {name: dict(c) for name, c in sampler.stacks.items() if c}
+
+
+# --------------------------------------------------
+# Profiler  —  one opt-in profile at a time
+# --------------------------------------------------
+class Profiler:
+    """Runs a StackSampler for the next N requests and/or a time window.
+
+    Off by default: with no profile running the only cost is the
+    middleware's header check. The last profile stays downloadable until
+    the next one starts.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._timer = None
+        self.active = False
+        self.remaining = None         # requests left, or None for time-only
+        self.started_at = None
+        self.stopped_at = None
+        self.deadline = None
+        self.requests = 0
+
+    def start(self, requests: int = None, seconds: float = None) -> dict:
+        """Begin a new profile (discarding the previous one)."""
+
+        seconds = min(seconds or self.max_seconds, self.max_seconds)
+        with self._lock:
+            self._stop_locked()
+            self._sampler = StackSampler(self.interval)
+            self._sampler.start()
+            self.active = True
+            self.remaining = requests
+            self.requests = 0
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.deadline = self.started_at + seconds
+            self._timer = threading.Timer(seconds, self._expire, args=(self.started_at,))
+            self._timer.daemon = True
+            self._timer.start()
+        return self.stats()
+
+    def stop(self) -> dict:
+        with self._lock:
+            self._stop_locked()
+        return self.stats()
+
+    def _expire(self, started_at: float):
+        with self._lock:
+            if self.started_at == started_at:   # not a newer profile started since
+                self._stop_locked()
+
+    def _stop_locked(self):
+        if not self.active:
+            return
+        self.active = False
+        self.stopped_at = time.time()
+        # Don't join: this runs on the event loop (ProfileMiddleware), and a
+        # sample in progress can take a while with many threads to walk
+        self._sampler.stop(wait=False)
+        self._timer.cancel()
+
+    def request_finished(self):
+        """Called by the middleware after each request while a profile runs."""
+
+        with self._lock:
+            if not self.active:
+                return
+            self.requests += 1
+            if self.remaining is not None:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self._stop_locked()
+
+    def merge(self, stacks: dict):
+        sampler = self._sampler
+        if sampler is not None:
+            sampler.merge(stacks)
+
+    def collapsed(self, name: str = "all") -> str:
+        return self._sampler.collapsed(name) if self._sampler is not None else ""
+
+    def stats(self) -> dict:
+        sampler = self._sampler
+        return {
+            "active": self.active,
+            "interval_ms": self.interval * 1000,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "deadline": self.deadline if self.active else None,
+            "requests": self.requests,
+            "remaining_requests": self.remaining if self.active else None,
+            "samples": sampler.samples if sampler else 0,
+            "idle_samples": sampler.idle if sampler else 0,
+            "dropped_stacks": sampler.dropped if sampler else 0,
+            "profiles": sampler.summary() if sampler else {},
+        }
+
+
+profiler = Profiler()
+
+
+# --------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------
+class ProfileMiddleware:
+    """Counts requests against a running profile; `X-Profile: N` starts one.
+
+    The header only takes effect together with a valid X-Admin-Key
+    (`authorize` gets the key and returns True/False), and profiles this
+    request and the N-1 after it.
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = admin_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value
+            elif name == b"x-admin-key":
+                admin_key = value
+        if requested is not None and not profiler.active and self.authorize((admin_key or b"").decode()):
+            try:
+                profiler.start(requests=max(1, int(requested)))
+            except ValueError:
+                pass
+
+        if not profiler.active:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.request_finished()
@@ -0,0 +1,233 @@
+"""Re-render historical invoices after a change to the invoice design.
+
+    cd backend
+    python regenerate_invoices.py --jsonl sessions.jsonl [--workers 8]
+    python regenerate_invoices.py --from-store            # SESSION_BACKEND=sqlite store
+    python regenerate_invoices.py --jsonl sessions.jsonl --force
+
+Each JSONL line is a session record: either the session dict itself with a
+"session_id" field, or {"session_id": ..., "session": {...}}. Sessions
+without a finished booking (no invoice issued) are skipped.
+
+Invoices are rendered across a process pool; every worker builds the
+template and registers the fonts once, then writes straight to the invoice
+store (INVOICE_DIR), in the day shard of each invoice's issue date. A
+manifest next to the invoices records a hash of each invoice's inputs
+(booking fields, issue date and invoice.py + font files), so a re-run only
+renders invoices whose inputs changed.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+
+from blob_store import INVOICE_DIR, LocalBlobStore, issue_day
+from session_store import SESSION_BACKEND
+
+INVOICE_FIELDS = ("store", "product", "details", "appointment_date", "appointment_time")
+MANIFEST_NAME = ".regen-manifest.db"
+
+
+# --------------------------------------------------
+# Inputs
+# --------------------------------------------------
+def read_jsonl(path: str):
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[regen] {path}:{n}: skipped, {e}", file=sys.stderr)
+                continue
+            session = record.get("session", record)
+            yield record.get("session_id") or session.get("session_id"), session
+
+
+def read_store():
+    from session_store import SqliteSessionStore
+    return SqliteSessionStore().items()
+
+
+def invoice_inputs(session_id: str, session: dict):
+    """The fields a render depends on, or None if the session has no invoice."""
+
+    if not session_id or session.get("invoice_generated") is False:
+        return None
+    data = {key: session.get(key) for key in INVOICE_FIELDS}
+    if not data["appointment_date"]:
+        return None
+    data["issued_at"] = session.get("invoice_issued_at") or session.get("issued_at")
+    return data
+
+
+def template_fingerprint() -> str:
+    """Changes whenever invoice.py or the font files change."""
+
+    from invoice import _FONT_DIR, FONT_FILES   # here, so --help doesn't load ReportLab
+    h = hashlib.sha256()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "invoice.py"), "rb") as f:
+        h.update(f.read())
+    for file in FONT_FILES.values():
+        path = os.path.join(_FONT_DIR, file)
+        h.update(f"{file}:{os.path.getsize(path) if os.path.exists(path) else -1}".encode())
+    return h.hexdigest()
+
+
+def input_hash(fingerprint: str, session_id: str, data: dict) -> str:
+    raw = json.dumps([fingerprint, session_id, data], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# --------------------------------------------------
+# Manifest (session_id -> input hash of the stored invoice)
+# --------------------------------------------------
+class Manifest:
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rendered ("
+            " session_id TEXT PRIMARY KEY,"
+            " input_hash TEXT NOT NULL,"
+            " rendered_at REAL NOT NULL)"
+        )
+
+    def current(self, session_id: str, digest: str) -> bool:
+        row = self._db.execute(
+            "SELECT input_hash FROM rendered WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None and row[0] == digest
+
+    def record(self, session_id: str, digest: str):
+        self._db.execute(
+            "INSERT OR REPLACE INTO rendered (session_id, input_hash, rendered_at) VALUES (?, ?, ?)",
+            (session_id, digest, time.time()),
+        )
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+# --------------------------------------------------
+# Workers
+# --------------------------------------------------
+_store = None
+
+
+def _init_worker(invoice_dir: str):
+    """Once per worker process: fonts, template and store."""
+    global _store
+    import invoice
+    invoice.get_template()
+    _store = LocalBlobStore(invoice_dir)
+
+
+def _render_one(job: tuple) -> tuple:
+    session_id, data, digest = job
+    from invoice import render_invoice
+    try:
+        # Into the issue date's shard, where downloads and retention look for it
+        _store.put(f"{session_id}.pdf", render_invoice(session_id, data), issue_day(data.get("issued_at")))
+        return session_id, digest, None
+    except Exception as e:
+        return session_id, digest, f"{type(e).__name__}: {e}"
+
+
+# --------------------------------------------------
+# Main
+# --------------------------------------------------
+class Progress:
+    def __init__(self, total: int, every: float = 1.0):
+        self.total = total
+        self.every = every
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self.done = self.failed = 0
+
+    def update(self, failed: bool, final: bool = False):
+        if not final:
+            self.done += 1
+            self.failed += failed
+        now = time.perf_counter()
+        if not final and now - self._last < self.every:
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        end = "\n" if final or not sys.stderr.isatty() else ""
+        print(f"\r[regen] {self.done}/{self.total} rendered, {self.failed} failed, "
+              f"{rate:.1f} invoices/s, ETA {eta:.0f}s   ", end=end, file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", help="session records exported as JSON lines")
+    source.add_argument("--from-store", action="store_true", help="read the configured session store")
+    parser.add_argument("--invoice-dir", default=INVOICE_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunksize", type=int, default=16, help="jobs handed to a worker at a time")
+    parser.add_argument("--force", action="store_true", help="re-render even if inputs are unchanged")
+    args = parser.parse_args()
+
+    os.makedirs(args.invoice_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(args.invoice_dir, MANIFEST_NAME))
+    fingerprint = template_fingerprint()
+
+    if args.from_store and SESSION_BACKEND != "sqlite":
+        # A memory store starts empty: it would "succeed" with nothing to render
+        parser.error(f"--from-store needs SESSION_BACKEND=sqlite (it is {SESSION_BACKEND!r})")
+
+    records = read_jsonl(args.jsonl) if args.jsonl else read_store()
+    jobs, skipped, no_invoice = [], 0, 0
+    for session_id, session in records:
+        data = invoice_inputs(session_id, session)
+        if data is None:
+            no_invoice += 1
+            continue
+        digest = input_hash(fingerprint, session_id, data)
+        if not args.force and manifest.current(session_id, digest):
+            skipped += 1
+            continue
+        jobs.append((session_id, data, digest))
+
+    print(f"[regen] {len(jobs)} to render, {skipped} already current, "
+          f"{no_invoice} without an invoice — {args.workers} workers", file=sys.stderr)
+
+    progress = Progress(len(jobs))
+    failures = []
+    if jobs:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                  initargs=(args.invoice_dir,)) as pool:
+            for n, (session_id, digest, error) in enumerate(
+                    pool.imap_unordered(_render_one, jobs, chunksize=args.chunksize), 1):
+                if error:
+                    failures.append((session_id, error))
+                else:
+                    manifest.record(session_id, digest)
+                if n % 500 == 0:
+                    manifest.commit()
+                progress.update(bool(error))
+        progress.update(False, final=True)
+    manifest.close()
+
+    for session_id, error in failures[:20]:
+        print(f"[regen] {session_id}: {error}", file=sys.stderr)
+    if len(failures) > 20:
+        print(f"[regen] ... and {len(failures) - 20} more failures", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
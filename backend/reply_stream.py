@@ -0,0 +1,88 @@
+import json
+import re
+
+# --------------------------------------------------
+# Incremental "reply" extraction from streamed JSON
+# --------------------------------------------------
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class ReplyExtractor:
+    """Pull the "reply" string out of a JSON object while it is still streaming.
+
+    Feed raw model deltas to `feed()`; it returns whatever new reply text has
+    become decodable since the last call. The full raw text is kept so the
+    caller can `json.loads(extractor.raw)` once the stream has finished.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.reply = ""
+        self.done = False
+        self._pos = None          # index in raw of the next undecoded reply char
+        self._pending_high = None  # high surrogate waiting for its pair
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        if self.done:
+            return ""
+
+        if self._pos is None:
+            m = _REPLY_KEY.search(self.raw)
+            if not m:
+                return ""
+            self._pos = m.end()
+
+        out = []
+        raw, i, n = self.raw, self._pos, len(self.raw)
+        while i < n:
+            ch = raw[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+
+            # Escape sequence — wait until it is complete
+            if i + 1 >= n:
+                break
+            esc = raw[i + 1]
+            if esc != "u":
+                out.append(_SIMPLE_ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            if i + 6 > n:
+                break
+            code = int(raw[i + 2:i + 6], 16)
+            i += 6
+            if 0xD800 <= code <= 0xDBFF:
+                self._pending_high = code
+                continue
+            if 0xDC00 <= code <= 0xDFFF and self._pending_high is not None:
+                code = 0x10000 + ((self._pending_high - 0xD800) << 10) + (code - 0xDC00)
+            self._pending_high = None
+            out.append(chr(code))
+
+        self._pos = i
+        text = "".join(out)
+        self.reply += text
+        return text
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL  = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))   # seconds
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")              # "" = memory only
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse the differences that don't change what the model sees."""
+    return _WS.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(namespace: str, version: str, text: str) -> str:
+    raw = f"{namespace}\0{version}\0{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _LeaderCancelled(Exception):
+    """The call a request was waiting on was cancelled with its own caller."""
+
+
+# --------------------------------------------------
+# Response Cache
+# --------------------------------------------------
+class ResponseCache:
+    """LRU + TTL cache of LLM results keyed on a content hash.
+
+    `get_or_compute(key, compute)` returns a cached value, or awaits one
+    `compute()` call. Identical requests that arrive while that call is in
+    flight wait for it instead of making their own. Failures are not cached.
+    With a `path`, entries are also written to SQLite and survive restarts.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE,
+                 ttl: float = RESPONSE_CACHE_TTL, path: str = RESPONSE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (value, expires_at)
+        self._inflight: dict = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db_lock = threading.Lock()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._entries.move_to_end(key)
+                return entry[0]
+            del self._entries[key]
+
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row and row[1] > time.time():
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                return value
+
+        return None
+
+    def lookup(self, key: str):
+        """`get()` that counts towards the hit/miss stats."""
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+
+    def _remember(self, key: str, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute):
+        retried = False
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += not retried
+                return value
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            self.coalesced += not retried
+            retried = True
+            try:
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                # Its client went away, not ours: the first waiter back here computes
+                continue
+
+        self.misses += not retried
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            # Don't cancel the shared future: waiters would see CancelledError,
+            # which the routes don't catch, for a request that wasn't theirs
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
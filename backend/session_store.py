@@ -0,0 +1,328 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+SESSION_BACKEND   = os.getenv("SESSION_BACKEND", "memory")          # memory | sqlite
+SESSION_DB_PATH   = os.getenv(
+    "SESSION_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "sessions.db"),
+)
+SESSION_IDLE_TTL  = float(os.getenv("SESSION_IDLE_TTL", "3600"))        # seconds without a turn
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_INVOICE_STATUS = "json_extract(data, '$.invoice_status')"
+
+
+def _claimable(session: dict, now: float, lease: float) -> bool:
+    return (
+        session.get("invoice_status") == "pending"
+        and now - (session.get("invoice_claimed_at") or 0) >= lease
+    )
+
+
+def _estimate_size(session: dict) -> int:
+    """Rough in-memory footprint of a session, dominated by its history."""
+    size = 512
+    for key in ("store", "product", "details"):
+        size += len(session.get(key) or "")
+    for msg in session.get("history", []):
+        size += 100 + len(msg.get("content") or "")
+    return size
+
+
+# --------------------------------------------------
+# Interface
+# --------------------------------------------------
+class SessionStore:
+    """Where booking sessions live between turns.
+
+    `get()` returns the session dict (a copy, for stores that serialize).
+    Changes go back with `update()`, which sets only the named fields on the
+    stored session: a turn still holding an older copy must not overwrite
+    the invoice status or summary that a background task saved meanwhile.
+    `save()` replaces the whole session and is for creating one. Stores may
+    evict idle sessions, so `get()` can return None for an id that used to
+    exist.
+    """
+
+    def new_id(self, prefix: str) -> str:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def save(self, session_id: str, session: dict):
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields) -> bool:
+        """Set `fields` on the stored session; False if it no longer exists."""
+        raise NotImplementedError
+
+    def claim_pending_invoices(self, owner: str, lease: float) -> list:
+        """(session_id, session) for each "pending" invoice nobody has claimed
+        in the last `lease` seconds, claimed for `owner` in the same step, so
+        workers sharing a store never both pick up one invoice."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def items(self):
+        """(session_id, session) for every stored session — for exports and batch jobs."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"sessions": len(self)}
+
+
+# --------------------------------------------------
+# In-memory LRU + idle TTL
+# --------------------------------------------------
+class MemorySessionStore(SessionStore):
+    """LRU ordered by last access; evicts idle sessions and caps count and bytes."""
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL,
+                 max_sessions: int = SESSION_MAX_COUNT,
+                 max_bytes: int = SESSION_MAX_BYTES):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+
+        # session_id -> [session, last_access, size]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids)}"
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def save(self, session_id: str, session: dict):
+        size = _estimate_size(session)
+        with self._lock:
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[session_id] = [session, time.monotonic(), size]
+            self._bytes += size
+            self._evict(time.monotonic())
+
+    def update(self, session_id: str, **fields) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return False
+            entry[0].update(fields)
+            size = _estimate_size(entry[0])
+            self._bytes += size - entry[2]
+            entry[1], entry[2] = time.monotonic(), size
+            self._entries.move_to_end(session_id)
+            self._evict(time.monotonic())
+            return True
+
+    def claim_pending_invoices(self, owner: str, lease: float) -> list:
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for session_id, (session, _, _) in self._entries.items():
+                if _claimable(session, now, lease):
+                    session.update(invoice_claimed_by=owner, invoice_claimed_at=now)
+                    claimed.append((session_id, session))
+        return claimed
+
+    def delete(self, session_id: str):
+        with self._lock:
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def _evict(self, now: float):
+        # Oldest access is always at the front, so idle expiry stops at the first live entry
+        while self._entries:
+            sid, (_, last_access, size) = next(iter(self._entries.items()))
+            over_limit = (
+                len(self._entries) > self.max_sessions
+                or self._bytes > self.max_bytes
+            )
+            if not over_limit and now - last_access < self.idle_ttl:
+                break
+            del self._entries[sid]
+            self._bytes -= size
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self):
+        with self._lock:
+            snapshot = [(sid, entry[0]) for sid, entry in self._entries.items()]
+        return iter(snapshot)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "evicted": self.evicted,
+        }
+
+
+# --------------------------------------------------
+# SQLite-backed (survives restarts)
+# --------------------------------------------------
+class SqliteSessionStore(SessionStore):
+    """One row per session, JSON-encoded; idle rows are swept on write."""
+
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self, path: str = SESSION_DB_PATH, idle_ttl: float = SESSION_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Routes run on the event loop and in the threadpool — share one
+        # connection behind a lock rather than one per thread.
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+        # So finding pending invoices doesn't read and decode every session
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_sessions_invoice_status ON sessions ({_INVOICE_STATUS})"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS session_ids (n INTEGER PRIMARY KEY AUTOINCREMENT)")
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.evicted = 0
+
+    def new_id(self, prefix: str) -> str:
+        with self._lock:
+            n = self._db.execute("INSERT INTO session_ids DEFAULT VALUES").lastrowid
+        return f"{prefix}-{n}"
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.idle_ttl:
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id: str, session: dict):
+        now = time.time()
+        data = json.dumps(session)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (session_id, data, now),
+            )
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._last_sweep = now
+                self.evicted += self._db.execute(
+                    "DELETE FROM sessions WHERE updated_at < ?", (now - self.idle_ttl,)
+                ).rowcount
+
+    def update(self, session_id: str, **fields) -> bool:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so another worker
+            # process can't slip a write in between the read and the update
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT data, updated_at FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                if row is None or now - row[1] >= self.idle_ttl:
+                    return False
+                session = json.loads(row[0])
+                session.update(fields)
+                self._db.execute(
+                    "UPDATE sessions SET data = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(session), now, session_id),
+                )
+            finally:
+                self._db.execute("COMMIT")
+        return True
+
+    def claim_pending_invoices(self, owner: str, lease: float) -> list:
+        now = time.time()
+        claimed = []
+        with self._lock:
+            # IMMEDIATE: a worker claiming at the same time waits, then sees these as taken
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    f"SELECT id, data FROM sessions WHERE {_INVOICE_STATUS} = 'pending' AND updated_at >= ?",
+                    (now - self.idle_ttl,),
+                ).fetchall()
+                for session_id, data in rows:
+                    session = json.loads(data)
+                    if not _claimable(session, now, lease):
+                        continue
+                    session.update(invoice_claimed_by=owner, invoice_claimed_at=now)
+                    self._db.execute("UPDATE sessions SET data = ? WHERE id = ?", (json.dumps(session), session_id))
+                    claimed.append((session_id, session))
+            finally:
+                self._db.execute("COMMIT")
+        return claimed
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def items(self):
+        # Page by id so a long export never holds the lock (or a cursor) for long
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, data FROM sessions WHERE id > ? ORDER BY id LIMIT 500", (last,)
+                ).fetchall()
+            if not rows:
+                return
+            for session_id, data in rows:
+                yield session_id, json.loads(data)
+            last = rows[-1][0]
+
+    def stats(self) -> dict:
+        return {"sessions": len(self), "evicted": self.evicted}
+
+
+def create_session_store() -> SessionStore:
+    """Build the store selected by SESSION_BACKEND."""
+    if SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore()
+    return MemorySessionStore()
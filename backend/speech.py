@@ -0,0 +1,240 @@
+import math
+import os
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+# Audio is 16-bit little-endian mono PCM
+AUDIO_SAMPLE_RATE    = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+VAD_FRAME_MS         = int(os.getenv("VAD_FRAME_MS", "20"))
+VAD_MIN_DB           = float(os.getenv("VAD_MIN_DB", "-45"))       # dBFS; never quieter than this counts as speech
+VAD_SNR_DB           = float(os.getenv("VAD_SNR_DB", "12"))        # dB above the tracked noise floor
+VAD_ZCR_MAX          = float(os.getenv("VAD_ZCR_MAX", "0.35"))     # crossings per sample; above = hiss, not voice
+VAD_HANGOVER_MS      = int(os.getenv("VAD_HANGOVER_MS", "200"))    # silence that ends an utterance
+VAD_MIN_SPEECH_MS    = int(os.getenv("VAD_MIN_SPEECH_MS", "60"))   # voiced time before speech counts (clicks don't)
+VAD_PRE_ROLL_MS      = int(os.getenv("VAD_PRE_ROLL_MS", "100"))    # audio kept from before the first voiced frame
+VAD_MAX_UTTERANCE_MS = int(os.getenv("VAD_MAX_UTTERANCE_MS", "30000"))
+STT_ENGINE           = os.getenv("STT_ENGINE", "stub")
+STT_STUB_TEXT        = os.getenv("STT_STUB_TEXT", "")              # stub's fixed transcript
+
+_INITIAL_NOISE_DB = -70.0
+
+
+class Segment(NamedTuple):
+    start_ms: int
+    end_ms: int
+    pcm: bytes
+
+
+class VadEvent(NamedTuple):
+    kind: str                       # "speech_start" | "speech_end"
+    ms: int                         # stream position when it was detected
+    segment: Optional[Segment] = None
+    continued: bool = False         # rest of an utterance split at VAD_MAX_UTTERANCE_MS
+
+
+def frame_features(samples: np.ndarray, frame_len: int) -> tuple:
+    """Energy (dBFS) and zero-crossing rate of each whole frame of int16 samples."""
+
+    frames = samples[: len(samples) // frame_len * frame_len].reshape(-1, frame_len)
+    frames = frames.astype(np.float32) / 32768.0
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1)
+    return energy_db, zcr
+
+
+# --------------------------------------------------
+# Voice activity detection
+# --------------------------------------------------
+class EnergyVAD:
+    """Splits a PCM stream into utterances by frame energy and zero-crossing rate.
+
+    `feed()` takes chunks of any size (odd bytes and partial frames carry
+    over) and classifies all whole frames in one vectorized pass. A frame is
+    voiced when it is louder than max(VAD_MIN_DB, noise floor + VAD_SNR_DB)
+    and its zero-crossing rate is below VAD_ZCR_MAX; the noise floor follows
+    the unvoiced frames. An utterance starts after VAD_MIN_SPEECH_MS of
+    voiced frames and ends after VAD_HANGOVER_MS of unvoiced ones, so the end
+    is reported one hangover (plus at most a frame) after the speech stops.
+    An utterance is also cut at VAD_MAX_UTTERANCE_MS; when speech resumes
+    within a hangover of that cut, the next utterance's events carry
+    `continued=True`, so a caller can tell it from someone starting to talk.
+    """
+
+    def __init__(self, sample_rate: int = AUDIO_SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS,
+                 min_db: float = VAD_MIN_DB, snr_db: float = VAD_SNR_DB, zcr_max: float = VAD_ZCR_MAX,
+                 hangover_ms: int = VAD_HANGOVER_MS, min_speech_ms: int = VAD_MIN_SPEECH_MS,
+                 pre_roll_ms: int = VAD_PRE_ROLL_MS, max_utterance_ms: int = VAD_MAX_UTTERANCE_MS):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_len * 2
+        self.min_db = min_db
+        self.snr_db = snr_db
+        self.zcr_max = zcr_max
+        self.hangover = max(1, math.ceil(hangover_ms / frame_ms))
+        self.min_speech = max(1, math.ceil(min_speech_ms / frame_ms))
+        self.max_frames = max(1, max_utterance_ms // frame_ms)
+        self.noise_db = _INITIAL_NOISE_DB
+
+        self._pending = b""                               # incomplete frame from the last chunk
+        self._pre_roll = deque(maxlen=pre_roll_ms // frame_ms)
+        self._speech = None                               # bytearray while in (candidate) speech
+        self._start_ms = 0
+        self._voiced = 0
+        self._silence = 0
+        self._started = False
+        self._split = False                               # the last utterance was cut at max length
+        self._gap = 0                                     # unvoiced frames since it was cut
+        self._continued = False
+
+        self.frames = 0
+        self.segments = 0
+
+    def feed(self, pcm: bytes) -> list:
+        """Consume a chunk; returns the VadEvents it completed."""
+
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return []
+
+        energy, zcr = frame_features(np.frombuffer(data, dtype="<i2", count=usable // 2), self.frame_len)
+        threshold = max(self.min_db, self.noise_db + self.snr_db)
+        voiced = (energy > threshold) & (zcr < self.zcr_max)
+
+        quiet = energy[~voiced]
+        if quiet.size:
+            # Same as updating an EMA (alpha 0.05) once per quiet frame with the chunk's mean
+            keep = 0.95 ** quiet.size
+            self.noise_db = keep * self.noise_db + (1 - keep) * float(np.mean(quiet))
+
+        events = []
+        for i, is_voiced in enumerate(voiced.tolist()):
+            event = self._step(data[i * self.frame_bytes:(i + 1) * self.frame_bytes], is_voiced)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _step(self, frame: bytes, is_voiced: bool) -> Optional[VadEvent]:
+        position = self.frames * self.frame_ms
+        self.frames += 1
+
+        if self._speech is None:
+            if not is_voiced:
+                self._pre_roll.append(frame)
+                self._gap += 1
+                return None
+            self._continued = self._split and self._gap < self.hangover
+            self._split = False
+            self._start_ms = position - len(self._pre_roll) * self.frame_ms
+            self._speech = bytearray(b"".join(self._pre_roll))
+            self._pre_roll.clear()
+            self._voiced = self._silence = 0
+            self._started = False
+
+        self._speech += frame
+        if is_voiced:
+            self._voiced += 1
+            self._silence = 0
+        else:
+            self._silence += 1
+
+        if not self._started and self._voiced >= self.min_speech:
+            self._started = True
+            return VadEvent("speech_start", self.frames * self.frame_ms, continued=self._continued)
+
+        if self._silence >= self.hangover:
+            return self._finish()
+        if len(self._speech) >= self.max_frames * self.frame_bytes:
+            return self._finish(split=True)
+        return None
+
+    def _finish(self, split: bool = False) -> Optional[VadEvent]:
+        speech, started, silence = self._speech, self._started, self._silence
+        self._speech = None
+        if not started:
+            return None   # too little voiced audio: a click or a cough, not an utterance
+        self._split, self._gap = split, 0
+
+        pcm = bytes(speech[: len(speech) - silence * self.frame_bytes])
+        self.segments += 1
+        end_ms = self._start_ms + len(pcm) // self.frame_bytes * self.frame_ms
+        return VadEvent("speech_end", self.frames * self.frame_ms, Segment(self._start_ms, end_ms, pcm),
+                        self._continued)
+
+    def flush(self) -> Optional[VadEvent]:
+        """End of stream: close an utterance that is still open."""
+
+        if self._speech is None:
+            return None
+        self._silence = 0
+        return self._finish()
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "segments": self.segments,
+            "noise_db": round(self.noise_db, 1),
+            "in_speech": self._started and self._speech is not None,
+        }
+
+
+# --------------------------------------------------
+# Speech-to-text engines
+# --------------------------------------------------
+class SpeechToText:
+    """Turns one finished utterance (16-bit mono PCM) into text.
+
+    Engines that block (local models, sync SDKs) should run the work in a
+    thread; `transcribe` is awaited on the event loop.
+    """
+
+    name = ""
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        raise NotImplementedError
+
+
+class StubSpeechToText(SpeechToText):
+    """Offline stand-in (tests, load tests): a fixed text, or the segment's length."""
+
+    name = "stub"
+
+    def __init__(self, text: str = STT_STUB_TEXT):
+        self.text = text
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        if self.text:
+            return self.text
+        return f"[{len(pcm) / 2 / sample_rate:.2f}s of speech]"
+
+
+_ENGINES = {"stub": StubSpeechToText}
+_engine = None
+
+
+def register_engine(name: str, factory):
+    """Make an engine selectable with STT_ENGINE=name; `factory()` builds it."""
+    _ENGINES[name] = factory
+
+
+def create_stt_engine(name: str = STT_ENGINE) -> SpeechToText:
+    """Build the engine selected by STT_ENGINE."""
+    if name not in _ENGINES:
+        raise ValueError(f"Unknown STT_ENGINE {name!r} (known: {', '.join(sorted(_ENGINES))})")
+    return _ENGINES[name]()
+
+
+def get_engine() -> SpeechToText:
+    """The process-wide engine, built on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_stt_engine()
+    return _engine
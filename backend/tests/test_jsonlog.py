@@ -0,0 +1,42 @@
+"""The log never carries a one-time code in plain text.
+
+    cd backend
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("USER_DB_PATH", os.path.join(tempfile.mkdtemp(), "users.db"))
+
+import jsonlog  # noqa: E402
+
+OTP = "493817"
+
+
+def _records(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_redact_hides_otp_at_any_depth():
+    record = jsonlog.redact({"event": "x", "otp": OTP, "nested": [{"otp": OTP}]})
+    assert OTP not in json.dumps(record)
+
+
+def test_dev_mode_otp_never_reaches_the_log(tmp_path, monkeypatch):
+    import auth
+
+    path = str(tmp_path / "log.jsonl")
+    monkeypatch.setattr(jsonlog, "_writer", jsonlog.LogWriter(path, redact_fields=True))
+    monkeypatch.setattr(auth.outbox, "settings", None)   # dev mode: the OTP is logged, not mailed
+
+    auth.send_otp_email("someone@example.com", "Someone", OTP)
+    jsonlog.shutdown()
+
+    with open(path) as f:
+        output = f.read()
+    assert OTP not in output
+    assert [r["event"] for r in _records(path)] == ["otp_not_sent"]
@@ -0,0 +1,133 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+AUTH_TOKEN_CACHE_SIZE     = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_REVOCATION_SYNC      = float(os.getenv("AUTH_REVOCATION_SYNC", "1"))   # seconds between store reads
+
+
+# --------------------------------------------------
+# Verified-token cache
+# --------------------------------------------------
+class TokenCache:
+    """LRU of already-verified JWTs -> their claims.
+
+    An entry is only good until the token's own `exp`, so a cache hit can
+    never outlive the token. Revocation is checked separately on every
+    request, hit or miss.
+    """
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()   # token -> claims
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self._entries.get(token)
+        if claims is not None:
+            if claims["exp"] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._entries[token]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        self._entries[token] = claims
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        self._entries.pop(token, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# --------------------------------------------------
+# Revocation list
+# --------------------------------------------------
+class RevocationList:
+    """Revoked token ids (`jti`) and per-user "revoked before" cut-offs.
+
+    Both are dict lookups, so `is_revoked()` costs the same however many
+    entries there are. With a `store` (the UserStore), revocations are also
+    written to its database and every worker reads the new ones at most
+    `sync_interval` seconds later, so a logout holds across processes. A
+    token id is forgotten once its `exp` has passed, and a user cut-off once
+    `token_ttl` has passed since it — every token it covered has expired by
+    then and the signature check rejects it anyway.
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, token_ttl: float, store=None, sync_interval: float = AUTH_REVOCATION_SYNC):
+        self.token_ttl = token_ttl
+        self.store = store
+        self.sync_interval = sync_interval
+        self._tokens: dict = {}     # jti -> exp
+        self._users: dict = {}      # user id -> tokens issued before this are revoked
+        self._last_id = 0           # newest store row already applied
+        self._last_sync = 0.0
+        self._last_prune = 0.0
+
+    def revoke_token(self, jti: str, exp: float):
+        self._tokens[jti] = exp
+        if self.store is not None:
+            self.store.add_revocation(jti=jti, expires_at=exp)
+        self._prune()
+
+    def revoke_user(self, user_id: str, before: float = None):
+        before = time.time() if before is None else before
+        self._users[user_id] = max(before, self._users.get(user_id, 0.0))
+        if self.store is not None:
+            self.store.add_revocation(user_id=user_id, before=before, expires_at=before + self.token_ttl)
+        self._prune()
+
+    def is_revoked(self, claims: dict) -> bool:
+        self._sync()
+        if claims.get("jti") in self._tokens:
+            return True
+        cutoff = self._users.get(claims["sub"])
+        # `iat` has sub-second precision, so a token issued right after a
+        # logout-all in the same second is not caught by it
+        return cutoff is not None and claims.get("iat", 0) < cutoff
+
+    def _sync(self):
+        now = time.time()
+        if self.store is None or now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        for row_id, jti, user_id, before, expires_at in self.store.revocations_since(self._last_id):
+            if jti:
+                self._tokens[jti] = expires_at
+            else:
+                self._users[user_id] = max(before, self._users.get(user_id, 0.0))
+            self._last_id = row_id
+        self._prune()
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        self._users = {uid: cut for uid, cut in self._users.items() if cut + self.token_ttl > now}
+        if self.store is not None:
+            self.store.prune_revocations(now)
+
+    def __len__(self) -> int:
+        return len(self._tokens) + len(self._users)
@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+import jsonlog
+
+log = jsonlog.get_logger("users")
+
+# --------------------------------------------------
+# Config
+# --------------------------------------------------
+DATA_DIR     = os.path.join(os.path.dirname(__file__), "data")
+USER_DB_PATH = os.getenv("USER_DB_PATH", os.path.join(DATA_DIR, "users.db"))
+USERS_FILE   = os.getenv("USERS_FILE", os.path.join(DATA_DIR, "users.json"))   # legacy, migrated once
+
+_COLUMNS = ("id", "name", "email", "password_hash", "created_at", "email_verified")
+
+
+def normalize_email(email: str) -> str:
+    return email.lower().strip()
+
+
+def _row_to_user(row) -> dict:
+    user = dict(zip(_COLUMNS, row))
+    if user["email_verified"] is None:
+        del user["email_verified"]
+    else:
+        user["email_verified"] = bool(user["email_verified"])
+    return user
+
+
+# --------------------------------------------------
+# User Repository
+# --------------------------------------------------
+class UserStore:
+    """Accounts in SQLite, looked up through the primary key (id) and a
+    unique index on the normalized email.
+
+    On first open, an existing users.json is imported in one transaction and
+    renamed to users.json.migrated, so the import never runs twice.
+    """
+
+    def __init__(self, path: str = USER_DB_PATH, legacy_file: str = USERS_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Auth routes run on the event loop and in the threadpool — share one connection behind a lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " id TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " email TEXT NOT NULL,"
+            " password_hash TEXT NOT NULL,"
+            " created_at TEXT NOT NULL,"
+            " email_verified INTEGER)"
+        )
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email)")
+        # Token revocations, shared by every worker (see token_cache.RevocationList)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS revocations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " jti TEXT,"
+            " user_id TEXT,"
+            " revoked_before REAL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_revocations_expires ON revocations (expires_at)")
+        self._lock = threading.Lock()
+
+        if legacy_file and os.path.exists(legacy_file):
+            self.migrate_from_json(legacy_file)
+
+    def migrate_from_json(self, legacy_file: str) -> int:
+        """Import a users.json list; returns the number of accounts added."""
+
+        with open(legacy_file, "r") as f:
+            users = json.load(f)
+
+        rows = [
+            (
+                u["id"],
+                u["name"],
+                normalize_email(u["email"]),
+                u["password_hash"],
+                u["created_at"],
+                None if "email_verified" not in u else int(bool(u["email_verified"])),
+            )
+            for u in users
+        ]
+
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                before = self._count()
+                # First registration wins if the file ever held the same email twice
+                self._db.executemany(
+                    f"INSERT OR IGNORE INTO users ({', '.join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                added = self._count() - before
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        os.replace(legacy_file, legacy_file + ".migrated")
+        log.info("users_migrated", added=added, total=len(rows), source=legacy_file)
+        return added
+
+    def get_by_email(self, email: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM users WHERE email = ?", (normalize_email(email),)
+            ).fetchone()
+        return _row_to_user(row) if row else None
+
+    def get_by_id(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+        return _row_to_user(row) if row else None
+
+    def email_exists(self, email: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM users WHERE email = ?", (normalize_email(email),)
+            ).fetchone()
+        return row is not None
+
+    def add(self, user: dict) -> bool:
+        """Insert a new account. Returns False if the email is already taken."""
+
+        email_verified = user.get("email_verified")
+        try:
+            with self._lock:
+                self._db.execute(
+                    f"INSERT INTO users ({', '.join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        user["id"],
+                        user["name"],
+                        normalize_email(user["email"]),
+                        user["password_hash"],
+                        user["created_at"],
+                        None if email_verified is None else int(bool(email_verified)),
+                    ),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update_password_hash(self, user_id: str, password_hash: str):
+        with self._lock:
+            self._db.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    def add_revocation(self, expires_at: float, jti: str = None, user_id: str = None, before: float = None):
+        """Record a revoked token id, or a user's "revoked before" cut-off."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO revocations (jti, user_id, revoked_before, expires_at) VALUES (?, ?, ?, ?)",
+                (jti, user_id, before, expires_at),
+            )
+
+    def revocations_since(self, last_id: int) -> list:
+        """(id, jti, user_id, revoked_before, expires_at) rows newer than `last_id`."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, jti, user_id, revoked_before, expires_at FROM revocations"
+                " WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+
+    def prune_revocations(self, now: float):
+        with self._lock:
+            self._db.execute("DELETE FROM revocations WHERE expires_at <= ?", (now,))
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
@@ -102,6 +102,25 @@ function CallPageContent() {
     startSession();
   }, []); // Empty dependency array - only run once
 
+  // Invoices render in the background — poll until the PDF is ready
+  const waitForInvoice = async (id: string) => {
+    for (let attempt = 0; attempt < 30; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      try {
+        const res = await fetch(`http://localhost:8001/session/${id}/invoice`);
+        if (!res.ok) continue;
+        const status = await res.json();
+        if (status.status === "ready" && status.invoice_url) {
+          setInvoiceUrl(status.invoice_url);
+          return;
+        }
+        if (status.status === "failed") return;
+      } catch (err) {
+        console.error("Invoice status error:", err);
+      }
+    }
+  };
+
   // Send Message
   const sendMessage = async () => {
     if (!input.trim() || !sessionId || isTyping) return;
@@ -146,6 +165,8 @@ function CallPageContent() {
 
         if (data.invoice_url) {
           setInvoiceUrl(data.invoice_url);
+        } else if (data.invoice_status === "pending") {
+          waitForInvoice(sessionId);
         }
       }, 500);
     } catch (err) {
@@ -46,6 +46,11 @@ function VoiceCallContent() {
   // sessionIdRef keeps sessionId always current inside stale closures
   // (the speak→listen→send chain is created before React re-renders with the new sessionId)
   const sessionIdRef = useRef<string | null>(null);
+  // One WebSocket per call: utterances go up, reply deltas and the invoice come down
+  const wsRef = useRef<WebSocket | null>(null);
+  const turnInFlightRef = useRef(false);
+  const streamingTurnRef = useRef<number | null>(null);
+  const listeningRef = useRef(false);
 
   // Memoize URL parameters
   const sessionParams = useMemo(() => ({
@@ -66,6 +71,94 @@ function VoiceCallContent() {
     console.log("🆔 Session ID changed to:", sessionId);
   }, [sessionId]);
 
+  // Close the call socket when leaving the page
+  useEffect(() => {
+    return () => {
+      wsRef.current?.close();
+    };
+  }, []);
+
+  // Call socket — falls back to HTTP POSTs (sendMessage) if it can't connect
+  const connectSocket = (id: string) => {
+    const ws = new WebSocket(`ws://localhost:8001/session/${id}/ws`);
+
+    ws.onopen = () => {
+      console.log("🔌 Call socket connected");
+      wsRef.current = ws;
+    };
+
+    ws.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+
+      switch (data.type) {
+        case "delta":
+          // First piece of a reply starts a new assistant message; the rest extend it
+          if (streamingTurnRef.current !== data.turn) {
+            streamingTurnRef.current = data.turn;
+            setMessages((prev) => [...prev, { role: "assistant", content: data.text }]);
+          } else {
+            setMessages((prev) => [
+              ...prev.slice(0, -1),
+              { role: "assistant", content: prev[prev.length - 1].content + data.text },
+            ]);
+          }
+          break;
+
+        case "reply":
+          console.log("📦 Reply over socket:", data);
+          turnInFlightRef.current = false;
+          setMessages((prev) => {
+            const streamed = streamingTurnRef.current === data.turn;
+            const rest = streamed ? prev.slice(0, -1) : prev;
+            return [...rest, { role: "assistant", content: data.assistant_message }];
+          });
+          streamingTurnRef.current = null;
+          handleReply(data, true);
+          break;
+
+        case "cancelled":
+          console.log("✋ Turn cancelled by barge-in:", data.turn);
+          // Drop the half-streamed reply the user talked over
+          if (streamingTurnRef.current === data.turn) {
+            setMessages((prev) => prev.slice(0, -1));
+            streamingTurnRef.current = null;
+          }
+          break;
+
+        case "invoice":
+          console.log("📄 Invoice pushed:", data);
+          if (data.status === "ready" && data.invoice_url) {
+            setInvoiceUrl(data.invoice_url);
+          }
+          break;
+
+        case "error":
+          console.error("❌ Socket error message:", data.error);
+          turnInFlightRef.current = false;
+          setCallState("active");
+          break;
+      }
+    };
+
+    ws.onclose = () => {
+      console.log("🔌 Call socket closed");
+      if (wsRef.current === ws) wsRef.current = null;
+      turnInFlightRef.current = false;
+    };
+  };
+
+  // Barge-in: the user started talking over the AI — stop speaking and cancel the in-flight turn
+  const bargeIn = () => {
+    if (synthRef.current?.speaking) {
+      synthRef.current.cancel();
+    }
+    if (turnInFlightRef.current && wsRef.current?.readyState === WebSocket.OPEN) {
+      console.log("✋ Barge-in: cancelling in-flight reply");
+      wsRef.current.send(JSON.stringify({ type: "barge_in" }));
+      turnInFlightRef.current = false;
+    }
+  };
+
   // Start Session
   const startSession = async () => {
     console.log("🚀 Starting session...");
@@ -100,6 +193,7 @@ function VoiceCallContent() {
       setSessionId(data.session_id);
       sessionIdRef.current = data.session_id; // sync ref immediately — avoids stale closure in sendMessage
       setMessages([{ role: "assistant", content: data.assistant_message }]);
+      connectSocket(data.session_id);
 
       console.log("✅ Session ID set in state:", data.session_id);
 
@@ -152,7 +246,8 @@ function VoiceCallContent() {
       setAiSpeaking(false);
 
       // Don't auto-start listening if call should end or is completed
-      if (!isCompletedRef.current && !shouldEndCallRef.current) {
+      // (or if the user already barged in and is being listened to)
+      if (!isCompletedRef.current && !shouldEndCallRef.current && !listeningRef.current) {
         console.log("🎤 Will auto-start listening in 1000ms...");
         // Start listening after AI finishes speaking
         setTimeout(() => {
@@ -201,10 +296,15 @@ function VoiceCallContent() {
 
     recognition.onstart = () => {
       console.log("✅ Speech recognition started - You can speak now!");
+      listeningRef.current = true;
       setCallState("listening");
       setCurrentTranscript("");
     };
 
+    recognition.onspeechstart = () => {
+      bargeIn();
+    };
+
     recognition.onresult = (event: any) => {
       let interimTranscript = "";
       let finalTranscript = "";
@@ -281,6 +381,7 @@ function VoiceCallContent() {
 
     recognition.onend = () => {
       console.log("🛑 Speech recognition ended");
+      listeningRef.current = false;
       if (callState === "listening") {
         setCallState("processing");
       }
@@ -319,6 +420,25 @@ function VoiceCallContent() {
     return goodbyePhrases.some(phrase => lowerText.includes(phrase));
   };
 
+  // Invoices render in the background — poll until the PDF is ready
+  const waitForInvoice = async (id: string) => {
+    for (let attempt = 0; attempt < 30; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      try {
+        const res = await fetch(`http://localhost:8001/session/${id}/invoice`);
+        if (!res.ok) continue;
+        const status = await res.json();
+        if (status.status === "ready" && status.invoice_url) {
+          setInvoiceUrl(status.invoice_url);
+          return;
+        }
+        if (status.status === "failed") return;
+      } catch (err) {
+        console.error("Invoice status error:", err);
+      }
+    }
+  };
+
   // Send Message to Backend
   const sendMessage = async (transcript: string) => {
     console.log("📤 Sending message to backend:", transcript);
@@ -344,6 +464,14 @@ function VoiceCallContent() {
     setMessages((prev) => [...prev, { role: "user", content: transcript }]);
     setCurrentTranscript(""); // Clear transcript display
 
+    // Preferred path: the call socket (the server cancels a reply still in flight)
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      console.log("🔌 Sending utterance over socket...");
+      turnInFlightRef.current = true;
+      wsRef.current.send(JSON.stringify({ type: "utterance", text: transcript }));
+      return;
+    }
+
     try {
       console.log("🌐 Making API call to backend...");
       console.log("Session ID:", sessionId);
@@ -365,47 +493,7 @@ function VoiceCallContent() {
       console.log("📦 Received data from backend:", data);
 
       setMessages((prev) => [...prev, { role: "assistant", content: data.assistant_message }]);
-
-      if (data.completed) {
-        console.log("✅ Booking completed!");
-        setCompleted(true);
-        setCallState("completed");
-        isCompletedRef.current = true; // Update ref immediately for callbacks
-      }
-
-      if (data.invoice_url) {
-        console.log("📄 Invoice URL received:", data.invoice_url);
-        setInvoiceUrl(data.invoice_url);
-      }
-
-      // Speak AI response
-      console.log("🔊 Will speak AI response in 500ms...");
-      setTimeout(() => {
-        speakText(data.assistant_message);
-      }, 500);
-
-      // ONLY auto-redirect if user said goodbye (NOT on booking completion)
-      // When booking completes, user should see invoice and download it
-      if (shouldEndCallRef.current && !data.completed) {
-        console.log("👋 User said goodbye. Will end call after AI finishes speaking...");
-        setTimeout(() => {
-          console.log("👋 Ending call and navigating to home...");
-          if (synthRef.current) {
-            synthRef.current.cancel();
-          }
-          if (recognitionRef.current) {
-            recognitionRef.current.stop();
-          }
-          // Reset the flag
-          shouldEndCallRef.current = false;
-          // Navigate to home
-          router.push("/");
-        }, 5000); // Wait 5 seconds for AI to finish speaking
-      } else if (shouldEndCallRef.current && data.completed) {
-        console.log("✅ Booking complete + goodbye detected. Staying on invoice screen.");
-        // Reset the flag but don't navigate - let user see invoice
-        shouldEndCallRef.current = false;
-      }
+      handleReply(data, false);
 
     } catch (err) {
       console.error("❌ Send message error:", err);
@@ -414,6 +502,55 @@ function VoiceCallContent() {
     }
   };
 
+  // Completed turn (from the socket or the HTTP fallback): state, invoice, speech, goodbye
+  const handleReply = (data: any, viaSocket: boolean) => {
+    if (data.completed) {
+      console.log("✅ Booking completed!");
+      setCompleted(true);
+      setCallState("completed");
+      isCompletedRef.current = true; // Update ref immediately for callbacks
+    }
+
+    if (data.invoice_url) {
+      console.log("📄 Invoice URL received:", data.invoice_url);
+      setInvoiceUrl(data.invoice_url);
+    } else if (data.invoice_status === "pending" && !viaSocket && sessionIdRef.current) {
+      // Over the socket the server pushes an "invoice" event instead
+      console.log("📄 Invoice rendering, waiting for it...");
+      waitForInvoice(sessionIdRef.current);
+    }
+
+    // Speak AI response
+    console.log("🔊 Will speak AI response in 500ms...");
+    setTimeout(() => {
+      speakText(data.assistant_message);
+    }, 500);
+
+    // ONLY auto-redirect if user said goodbye (NOT on booking completion)
+    // When booking completes, user should see invoice and download it
+    if (shouldEndCallRef.current && !data.completed) {
+      console.log("👋 User said goodbye. Will end call after AI finishes speaking...");
+      setTimeout(() => {
+        console.log("👋 Ending call and navigating to home...");
+        if (synthRef.current) {
+          synthRef.current.cancel();
+        }
+        if (recognitionRef.current) {
+          recognitionRef.current.stop();
+        }
+        wsRef.current?.close();
+        // Reset the flag
+        shouldEndCallRef.current = false;
+        // Navigate to home
+        router.push("/");
+      }, 5000); // Wait 5 seconds for AI to finish speaking
+    } else if (shouldEndCallRef.current && data.completed) {
+      console.log("✅ Booking complete + goodbye detected. Staying on invoice screen.");
+      // Reset the flag but don't navigate - let user see invoice
+      shouldEndCallRef.current = false;
+    }
+  };
+
   // Start Call
   const handleStartCall = () => {
     startSession();
@@ -427,6 +564,7 @@ function VoiceCallContent() {
     if (recognitionRef.current) {
       recognitionRef.current.stop();
     }
+    wsRef.current?.close();
     router.push("/");
   };
 
@@ -785,6 +923,22 @@ function VoiceCallContent() {
               </motion.button>
             )}
 
+            {/* Talk over the AI: stops its speech and cancels the reply being generated */}
+            {(aiSpeaking || (callState === "processing" && turnInFlightRef.current)) && !showTextInput && (
+              <motion.button
+                onClick={startListening}
+                className="px-8 py-4 rounded-2xl bg-white/10 border-2 border-white/20 flex items-center justify-center shadow-2xl gap-3"
+                whileHover={{ scale: 1.05 }}
+                whileTap={{ scale: 0.95 }}
+                initial={{ scale: 0 }}
+                animate={{ scale: 1 }}
+                transition={{ type: "spring", stiffness: 200 }}
+              >
+                <MicrophoneIcon className="w-6 h-6 text-white" />
+                <span className="text-white font-bold text-lg">Interrupt</span>
+              </motion.button>
+            )}
+
             {/* Manual Tap to Speak Button (when AI finishes speaking) */}
             {callState === "active" && !aiSpeaking && !showTextInput && (
               <>